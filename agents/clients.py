@@ -0,0 +1,96 @@
+from langchain_google_genai import ChatGoogleGenerativeAI
+from requests.adapters import HTTPAdapter
+import os
+import requests
+import threading
+
+TAVILY_API_URL = "https://api.tavily.com"
+# Connections kept alive per host; should cover the number of searches run in parallel
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", 16))
+
+_lock = threading.Lock()
+_chat_models = {}
+_tavily_clients = {}
+
+
+class TavilyClient:
+    """
+    Tavily search client that reuses one pooled, keep-alive HTTP session.
+
+    Unlike building a TavilySearchResults tool per query, repeated searches skip
+    the TCP and TLS handshakes once a connection to the API is open.
+
+    Args:
+        api_key: Tavily API key; defaults to the TAVILY_API_KEY environment variable
+        pool_size: Maximum number of connections kept open to the API
+        timeout: Per-request timeout in seconds
+    """
+
+    def __init__(self, api_key=None, pool_size=HTTP_POOL_SIZE, timeout=30):
+        self.api_key = api_key or os.getenv("TAVILY_API_KEY")
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+        })
+
+    def search(self, query, max_results=5, search_depth="basic"):
+        """Return Tavily's result dicts (``url``, ``title``, ``content``, ``score``) for a query."""
+        response = self.session.post(
+            f"{TAVILY_API_URL}/search",
+            json={"query": query, "max_results": max_results, "search_depth": search_depth},
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        return response.json().get("results", [])
+
+    def close(self):
+        self.session.close()
+
+
+def _rate_limit_key(rate_limiter):
+    """Identify a rate limiter by its settings, falling back to the object for limiters without the usual ones."""
+    if rate_limiter is None:
+        return None
+    settings = tuple(
+        getattr(rate_limiter, name, None) for name in ("requests_per_second", "check_every_n_seconds", "max_bucket_size")
+    )
+    if all(setting is None for setting in settings):
+        return rate_limiter
+    return (type(rate_limiter).__name__, *settings)
+
+
+def get_chat_model(model="gemini-2.0-flash", temperature=0.5, rate_limiter=None, timeout=None, max_retries=6):
+    """
+    Return the shared chat model for a configuration, creating it on first use.
+
+    Each model instance holds its own API client and connections, so sharing it
+    keeps them open across research runs and threads. Rate limiters are matched
+    by their settings, so a new limiter with the same rate reuses the model (and
+    the limiter) created for the first one instead of adding another client.
+    """
+    key = (model, temperature, _rate_limit_key(rate_limiter), timeout, max_retries)
+    with _lock:
+        if key not in _chat_models:
+            _chat_models[key] = ChatGoogleGenerativeAI(
+                model=model,
+                temperature=temperature,
+                google_api_key=os.getenv("GOOGLE_API_KEY"),
+                rate_limiter=rate_limiter,
+                timeout=timeout,
+                max_retries=max_retries
+            )
+        return _chat_models[key]
+
+
+def get_tavily_client(api_key=None):
+    """Return the shared Tavily client for an API key (default: TAVILY_API_KEY), creating it on first use."""
+    api_key = api_key or os.getenv("TAVILY_API_KEY")
+    with _lock:
+        if api_key not in _tavily_clients:
+            _tavily_clients[api_key] = TavilyClient(api_key)
+        return _tavily_clients[api_key]
@@ -0,0 +1,133 @@
+from dataclasses import dataclass, field
+import os
+import re
+
+from agents.sources import Source
+
+DRAFT_TOKEN_BUDGET = int(os.getenv("DRAFT_TOKEN_BUDGET", 3000))
+# Rough English average; close enough to budget a prompt without a model-specific tokenizer
+CHARS_PER_TOKEN = 4
+# Snippets sharing at least this fraction of their word shingles count as duplicates
+DUPLICATE_SIMILARITY = 0.8
+# A truncated snippet shorter than this is not worth including
+MIN_SNIPPET_TOKENS = 40
+# Question words ignored when matching a question against sources
+QUERY_STOPWORDS = frozenset("a an and are for how in is of on the to what which who why with".split())
+
+
+@dataclass(slots=True)
+class PackedContext:
+    """The sources chosen for a drafting prompt and what packing saved."""
+    sources: list[Source] = field(default_factory=list)
+    text: str = ""
+    tokens: int = 0
+    original_tokens: int = 0
+    duplicates: int = 0
+    dropped: int = 0
+
+    @property
+    def tokens_saved(self):
+        return self.original_tokens - self.tokens
+
+
+def estimate_tokens(text):
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def _words(text):
+    return re.findall(r"\w+", text.lower())
+
+
+def _shingles(text, size=3):
+    words = _words(text)
+    # Snippets without words have nothing to compare, so they are never taken for duplicates
+    if not words:
+        return set()
+    return {" ".join(words[i:i + size]) for i in range(max(1, len(words) - size + 1))}
+
+
+def _is_duplicate(shingles, kept):
+    for other in kept:
+        overlap = len(shingles & other)
+        if overlap and overlap / min(len(shingles), len(other)) >= DUPLICATE_SIMILARITY:
+            return True
+    return False
+
+
+def relevance(source, query_terms):
+    """Blend the backend's score with the share of query terms found in the source."""
+    if not query_terms:
+        return source.score
+    words = set(_words(f"{source.title} {source.snippet}"))
+    coverage = len(query_terms & words) / len(query_terms)
+    return 0.5 * source.score + 0.5 * coverage
+
+
+def _truncate(text, tokens):
+    """Cut ``text`` to about ``tokens`` tokens, preferring a sentence and then a word boundary."""
+    limit = tokens * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    cut = text[:limit]
+    sentence_end = max(cut.rfind(". "), cut.rfind("? "), cut.rfind("! "))
+    if sentence_end > limit // 2:
+        return cut[:sentence_end + 1]
+    return cut.rsplit(" ", 1)[0] + " ..."
+
+
+def pack_context(result, budget=DRAFT_TOKEN_BUDGET, max_sources=None):
+    """
+    Choose and trim the sources of a ResearchResult to fit a drafting token budget.
+
+    Near-identical snippets are dropped, the rest ranked by relevance to the
+    question, and the best ``max_sources`` share the budget; sources too long for
+    their share are truncated, and those left with too little room are dropped.
+    Sources with an empty snippet are never taken for duplicates of each other.
+
+    Args:
+        result: The ResearchResult to pack
+        budget: Maximum estimated tokens for the rendered sources
+        max_sources: Maximum number of sources to keep (None keeps all that fit)
+
+    Returns:
+        A PackedContext with the rendered text and token accounting
+    """
+    packed = PackedContext(original_tokens=estimate_tokens(result.to_text()))
+
+    unique, kept_shingles = [], []
+    for source in result.sources:
+        shingles = _shingles(source.snippet)
+        if _is_duplicate(shingles, kept_shingles):
+            packed.duplicates += 1
+            continue
+        unique.append(source)
+        kept_shingles.append(shingles)
+
+    query_terms = set(_words(result.query)) - QUERY_STOPWORDS
+    ranked = sorted(unique, key=lambda source: relevance(source, query_terms), reverse=True)
+
+    candidates = ranked[:max_sources] if max_sources is not None else ranked
+
+    # Share the budget water-filling style: short sources take what they need and
+    # the rest is split evenly, so one long page cannot crowd out the others
+    costs = [estimate_tokens(source.to_text()) + 1 for source in candidates]
+    allowance, remaining = [0] * len(candidates), budget
+    for n, i in enumerate(sorted(range(len(candidates)), key=costs.__getitem__)):
+        allowance[i] = min(costs[i], remaining // (len(candidates) - n))
+        remaining -= allowance[i]
+
+    blocks = []
+    for source, cost, tokens in zip(candidates, costs, allowance):
+        if tokens < cost:
+            header_tokens = estimate_tokens(f"Source: {source.url}\n") + 1
+            if tokens - header_tokens < MIN_SNIPPET_TOKENS:
+                continue
+            snippet = _truncate(source.snippet, tokens - header_tokens)
+            source = Source(source.url, source.title, snippet, source.score, source.fetched_at)
+        packed.sources.append(source)
+        blocks.append(source.to_text())
+
+    packed.dropped = len(unique) - len(packed.sources)
+    packed.text = "\n\n".join(blocks)
+    packed.tokens = estimate_tokens(packed.text)
+    return packed
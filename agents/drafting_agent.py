@@ -1,36 +1,428 @@
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.schema import SystemMessage, HumanMessage
+from agents.cache import build_cache
+from agents.clients import get_chat_model
+from agents.context import estimate_tokens, pack_context, DRAFT_TOKEN_BUDGET
+from agents.events import emit, CONTEXT_PACKED, DRAFTING_STARTED, FIRST_TOKEN, DONE
+from agents.resilience import RetryPolicy, aresilient_stream, get_breaker, resilient_call, resilient_stream
+from agents.routing import DraftingRouter, ModelRoute
+from agents.singleflight import SingleFlight
+from agents.sources import ResearchResult
+from agents.tracing import add_usage, annotate, get_tracer
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+import hashlib
 import os
+import threading
 
-def get_drafting_llm():
-    return ChatGoogleGenerativeAI(
-        model="gemini-2.0-flash",
-        temperature=0.5,
-        google_api_key=os.getenv("GOOGLE_API_KEY")
+DRAFT_CACHE_PATH = os.getenv("DRAFT_CACHE_PATH", os.path.join(".cache", "drafts.sqlite"))
+DRAFT_CACHE_TTL = float(os.getenv("DRAFT_CACHE_TTL", 7 * 24 * 60 * 60))
+# Longest wait in seconds for one model's answer, or for the next chunk while streaming
+DRAFT_TIMEOUT = float(os.getenv("DRAFT_TIMEOUT", 60))
+DRAFT_RETRIES = int(os.getenv("DRAFT_RETRIES", 2))
+# Preferred drafting model, and the one tried when it misses DRAFT_LATENCY_BUDGET (empty disables fallback)
+DRAFT_MODEL = os.getenv("DRAFT_MODEL", "gemini-2.0-flash")
+DRAFT_FALLBACK_MODEL = os.getenv("DRAFT_FALLBACK_MODEL", "gemini-2.0-flash-lite")
+# Map-reduce drafting: sources summarized per map call, and map calls in flight at once
+MAP_CHUNK_SIZE = int(os.getenv("MAP_CHUNK_SIZE", 3))
+MAP_CONCURRENCY = int(os.getenv("MAP_CONCURRENCY", 4))
+
+DRAFT_MODES = ["single", "map_reduce"]
+
+_draft_cache = None
+_draft_cache_lock = threading.Lock()
+# Concurrent drafts of the same prompt by the same model share one model call
+draft_flights = SingleFlight()
+
+
+def get_drafting_llm(rate_limiter=None):
+    """
+    Return the drafting model: a router over the shared Gemini models (one per rate limit).
+
+    The router sends each prompt to DRAFT_MODEL unless its recorded latency for
+    prompts of that size exceeds the latency budget, and falls back to
+    DRAFT_FALLBACK_MODEL when a call misses the budget or fails.
+    """
+    models = [name for name in (DRAFT_MODEL, DRAFT_FALLBACK_MODEL) if name]
+    # Retries are left to the resilience layer around each call, so the client tries once
+    return DraftingRouter(timeout=DRAFT_TIMEOUT, routes=[
+        ModelRoute(name, get_chat_model(
+            name, temperature=0.5, rate_limiter=rate_limiter, timeout=DRAFT_TIMEOUT, max_retries=1
+        ))
+        for name in dict.fromkeys(models)
+    ])
+
+
+def get_draft_cache():
+    """Return the process-wide drafted-answer cache, creating it on first use."""
+    global _draft_cache
+    with _draft_cache_lock:
+        if _draft_cache is None:
+            _draft_cache = build_cache(DRAFT_CACHE_PATH, max_entries=128, ttl=DRAFT_CACHE_TTL)
+    return _draft_cache
+
+
+
+def get_model_name(llm):
+    return getattr(llm, "model", None) or getattr(llm, "model_name", None) or type(llm).__name__
+
+
+def draft_cache_key(instructions, research_output, model_name, temperature):
+    """Content-address a draft by everything that determines the model's output."""
+    digest = hashlib.sha256()
+    for part in (instructions, research_output, model_name, repr(temperature)):
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\0")
+    return "draft:" + digest.hexdigest()
+
+
+def build_instructions(include_citations=True):
+    instructions = "You are an expert analyst. Draft a well-organized summary from the following information."
+    
+    if include_citations:
+        instructions += " Include relevant citations where appropriate."
+    else:
+        instructions += " Focus on presenting the information without citations."
+
+    return instructions
+
+
+def _record_usage(messages, text, usage=None):
+    """Add a model call's token counts to the active trace span, estimating them when the provider reports none."""
+    if usage:
+        add_usage(input_tokens=usage["input_tokens"], output_tokens=usage["output_tokens"])
+    else:
+        add_usage(
+            input_tokens=sum(estimate_tokens(str(message.content)) for message in messages),
+            output_tokens=estimate_tokens(text),
+        )
+
+
+def _answer_deadline(llm):
+    """Seconds to wait for an answer, or a stream's first chunk; a router may work through all its routes first."""
+    return llm.deadline if isinstance(llm, DraftingRouter) else DRAFT_TIMEOUT
+
+
+def _invoke(llm, messages):
+    message = resilient_call(
+        llm.invoke, messages,
+        timeout=_answer_deadline(llm), retry=RetryPolicy(attempts=DRAFT_RETRIES), breaker=get_breaker("drafting"),
     )
+    _record_usage(messages, message.content, getattr(message, "usage_metadata", None))
+    return message
+
+
+def _stream(llm, messages):
+    """Stream from the LLM, retrying a try that fails or stalls before its first chunk."""
+    parts, usage = [], None
+    for chunk in resilient_stream(
+        lambda: llm.stream(messages), first_timeout=_answer_deadline(llm),
+        timeout=DRAFT_TIMEOUT, retry=RetryPolicy(attempts=DRAFT_RETRIES), breaker=get_breaker("drafting"),
+    ):
+        parts.append(chunk.content)
+        # Providers that report usage put it on the final chunk
+        usage = getattr(chunk, "usage_metadata", None) or usage
+        yield chunk
+    _record_usage(messages, "".join(parts), usage)
+
+
+def _draft(llm, messages, key, cache):
+    answer = _invoke(llm, messages).content
+    if cache is not None and answer:
+        cache.set(key, answer)
+    return answer
+
+
+def _stream_text(llm, messages, key, cache):
+    """Yield the non-empty text chunks of a streamed draft, caching the answer once the stream completes."""
+    parts = []
+    for chunk in _stream(llm, messages):
+        if chunk.content:
+            parts.append(chunk.content)
+            yield chunk.content
+    answer = "".join(parts)
+    if cache is not None and answer:
+        cache.set(key, answer)
+
+
+async def _astream_text(llm, messages, key, cache):
+    """Async counterpart of _stream_text, with the same deadline, retries, breaker and usage recording as _stream."""
+    parts, usage = [], None
+    async for chunk in aresilient_stream(
+        lambda: llm.astream(messages), first_timeout=_answer_deadline(llm),
+        timeout=DRAFT_TIMEOUT, retry=RetryPolicy(attempts=DRAFT_RETRIES), breaker=get_breaker("drafting"),
+    ):
+        usage = getattr(chunk, "usage_metadata", None) or usage
+        if chunk.content:
+            parts.append(chunk.content)
+            yield chunk.content
+    _record_usage(messages, "".join(parts), usage)
+    answer = "".join(parts)
+    if cache is not None and answer:
+        cache.set(key, answer)
+
+
+def _resolve_cache(llm, cache, cache_nondeterministic):
+    temperature = getattr(llm, "temperature", None)
+    if temperature and not cache_nondeterministic:
+        return None
+    return cache if cache is not None else get_draft_cache()
+
 
-def draft_answer(llm, research_output, include_citations=True):
+def _pack(research_output, token_budget, max_sources, on_event):
+    with get_tracer().span("packing", budget=token_budget) as span:
+        packed = pack_context(research_output, budget=token_budget, max_sources=max_sources)
+        span.set(sources=len(packed.sources), tokens=packed.tokens, tokens_saved=packed.tokens_saved)
+    emit(
+        on_event, CONTEXT_PACKED,
+        f"Packed {len(packed.sources)} sources into ~{packed.tokens} tokens (saved ~{packed.tokens_saved})",
+        tokens=packed.tokens, tokens_saved=packed.tokens_saved,
+        duplicates=packed.duplicates, dropped=packed.dropped,
+    )
+    return packed
+
+
+def _build_messages(llm, research_output, include_citations, token_budget, max_sources, on_event):
+    if isinstance(research_output, ResearchResult):
+        # Sources are only rendered to text here, at drafting time, trimmed to the token budget
+        research_output = _pack(research_output, token_budget, max_sources, on_event).text
+    instructions = build_instructions(include_citations)
+    key = draft_cache_key(instructions, research_output, get_model_name(llm), getattr(llm, "temperature", None))
+    messages = [
+        SystemMessage(content=instructions),
+        HumanMessage(content=research_output)
+    ]
+    return messages, key
+
+
+def draft_answer(llm, research_output, include_citations=True, cache=None, cache_nondeterministic=False, on_event=None,
+                 token_budget=DRAFT_TOKEN_BUDGET, max_sources=None):
     """
     Draft an answer based on research output using the provided LLM.
     
     Args:
         llm: The language model to use
-        research_output: The research results to summarize
+        research_output: The ResearchResult (or pre-rendered research text) to summarize
         include_citations: Whether to include citations in the summary
+        cache: Cache to consult; defaults to the process-wide draft cache
+        cache_nondeterministic: Also cache answers drafted at a temperature above zero
+        on_event: Optional callback receiving ProgressEvent updates
+        token_budget: Estimated token budget for the sources of a ResearchResult
+        max_sources: Maximum number of sources of a ResearchResult put in the prompt
     
     Returns:
         The drafted answer as a string
     """
-    instructions = "You are an expert analyst. Draft a well-organized summary from the following information."
-    
+    cache = _resolve_cache(llm, cache, cache_nondeterministic)
+    messages, key = _build_messages(llm, research_output, include_citations, token_budget, max_sources, on_event)
+
+    emit(on_event, DRAFTING_STARTED, "Drafting comprehensive answer...")
+    answer = cache.get(key) if cache is not None else None
+    annotate(cached=answer is not None)
+    if answer is None:
+        answer = draft_flights.do(key, _draft, llm, messages, key, cache)
+
+    emit(on_event, DONE, "Answer generation completed", word_count=len(answer.split()))
+    return answer
+
+
+def stream_draft_answer(llm, research_output, include_citations=True, cache=None, cache_nondeterministic=False, on_event=None,
+                        token_budget=DRAFT_TOKEN_BUDGET, max_sources=None):
+    """
+    Streaming variant of draft_answer that yields the answer in chunks as the LLM produces them.
+
+    A cached answer is yielded as a single chunk, as is the answer of an identical
+    draft already streaming in another thread or task, once that one completes.
+    The assembled answer is cached only once the stream has been fully consumed.
+
+    Yields:
+        Text chunks of the drafted answer
+    """
+    cache = _resolve_cache(llm, cache, cache_nondeterministic)
+    messages, key = _build_messages(llm, research_output, include_citations, token_budget, max_sources, on_event)
+
+    emit(on_event, DRAFTING_STARTED, "Drafting comprehensive answer...")
+    cached = cache.get(key) if cache is not None else None
+    annotate(cached=cached is not None)
+    if cached is not None:
+        emit(on_event, FIRST_TOKEN, "Serving cached answer", cached=True)
+        yield cached
+        emit(on_event, DONE, "Answer generation completed", word_count=len(cached.split()))
+        return
+
+    parts = []
+    for chunk in draft_flights.stream(key, _stream_text, llm, messages, key, cache):
+        if not parts:
+            emit(on_event, FIRST_TOKEN, "Receiving answer...", cached=False)
+        parts.append(chunk)
+        yield chunk
+    emit(on_event, DONE, "Answer generation completed", word_count=len("".join(parts).split()))
+
+
+async def astream_draft_answer(llm, research_output, include_citations=True, cache=None, cache_nondeterministic=False, on_event=None,
+                               token_budget=DRAFT_TOKEN_BUDGET, max_sources=None):
+    """Async iterator counterpart of stream_draft_answer for use inside an event loop."""
+    cache = _resolve_cache(llm, cache, cache_nondeterministic)
+    messages, key = _build_messages(llm, research_output, include_citations, token_budget, max_sources, on_event)
+
+    emit(on_event, DRAFTING_STARTED, "Drafting comprehensive answer...")
+    cached = cache.get(key) if cache is not None else None
+    annotate(cached=cached is not None)
+    if cached is not None:
+        emit(on_event, FIRST_TOKEN, "Serving cached answer", cached=True)
+        yield cached
+        emit(on_event, DONE, "Answer generation completed", word_count=len(cached.split()))
+        return
+
+    parts = []
+    async for chunk in draft_flights.astream(key, _astream_text, llm, messages, key, cache):
+        if not parts:
+            emit(on_event, FIRST_TOKEN, "Receiving answer...", cached=False)
+        parts.append(chunk)
+        yield chunk
+    emit(on_event, DONE, "Answer generation completed", word_count=len("".join(parts).split()))
+
+
+def build_map_instructions(include_citations=True):
+    instructions = "You are an expert analyst. Summarize the key findings of the numbered sources below."
     if include_citations:
-        instructions += " Include relevant citations where appropriate."
+        instructions += (
+            " Cite every finding with the number of its source in square brackets, e.g. [2],"
+            " keeping the numbers exactly as given."
+        )
+    return instructions
+
+
+def build_reduce_instructions(include_citations=True):
+    instructions = (
+        "You are an expert analyst. Combine the partial summaries below into one well-organized answer,"
+        " merging overlapping points."
+    )
+    if include_citations:
+        instructions += (
+            " Keep the bracketed source numbers attached to the findings they support and do not renumber them."
+            " End with the list of sources you cited."
+        )
     else:
         instructions += " Focus on presenting the information without citations."
-    
-    messages = [
-        SystemMessage(content=instructions),
-        HumanMessage(content=research_output)
+    return instructions
+
+
+def map_summaries(llm, sources, include_citations=True, chunk_size=MAP_CHUNK_SIZE, concurrency=MAP_CONCURRENCY):
+    """
+    Summarize groups of sources in parallel, numbering sources across all groups.
+
+    Each map call gets the same deadline, retries and circuit breaker as a
+    single-pass draft. Groups whose call fails are skipped; an error is raised
+    only when every one fails.
+
+    Args:
+        llm: The language model to use
+        sources: Source objects, in citation order
+        include_citations: Ask for bracketed source numbers in the summaries
+        chunk_size: Number of sources per map call
+        concurrency: Maximum number of map calls in flight at once
+
+    Returns:
+        A list of partial summaries, in source order
+    """
+    instructions = build_map_instructions(include_citations)
+    batches = []
+    for start in range(0, len(sources), chunk_size):
+        numbered = [
+            f"[{start + i + 1}] {source.to_text()}"
+            for i, source in enumerate(sources[start:start + chunk_size])
+        ]
+        batches.append([SystemMessage(content=instructions), HumanMessage(content="\n\n".join(numbered))])
+
+    summaries, errors = [], []
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="drafting-map") as executor:
+        # Each call runs in a copy of this context, so its usage lands on the active trace span
+        futures = [executor.submit(contextvars.copy_context().run, _invoke, llm, messages) for messages in batches]
+        for future in futures:
+            try:
+                summaries.append(future.result().content)
+            except Exception as exc:
+                errors.append(exc)
+    if not summaries and errors:
+        raise errors[0]
+    return summaries
+
+
+def _build_reduce_messages(summaries, sources, include_citations):
+    parts = [f"Partial summary {i + 1}:\n{summary}" for i, summary in enumerate(summaries)]
+    if include_citations:
+        parts.append("Sources:\n" + "\n".join(f"[{i + 1}] {source.url}" for i, source in enumerate(sources)))
+    return [
+        SystemMessage(content=build_reduce_instructions(include_citations)),
+        HumanMessage(content="\n\n".join(parts)),
     ]
-    
-    return llm(messages).content
\ No newline at end of file
+
+
+def _stream_map_reduce_text(llm, sources, include_citations, chunk_size, concurrency, key, cache):
+    """Yield the non-empty text chunks of the reduce step over the map summaries, caching the answer at the end."""
+    summaries = map_summaries(llm, sources, include_citations, chunk_size, concurrency)
+    yield from _stream_text(llm, _build_reduce_messages(summaries, sources, include_citations), key, cache)
+
+
+def stream_map_reduce_answer(llm, research_output, include_citations=True, cache=None, cache_nondeterministic=False,
+                             on_event=None, token_budget=DRAFT_TOKEN_BUDGET, max_sources=None,
+                             chunk_size=MAP_CHUNK_SIZE, concurrency=MAP_CONCURRENCY):
+    """
+    Map-reduce variant of stream_draft_answer for large research sets.
+
+    Sources are summarized ``chunk_size`` at a time in parallel, with numbering kept
+    global so citations survive, and the reduce step's merged answer is streamed.
+    Each map call gets up to ``token_budget`` tokens of sources. Pre-rendered
+    research text has no sources to split, so it is drafted in a single pass.
+    Identical map-reduce drafts in flight at once share one set of model calls.
+
+    Args:
+        llm: The language model to use
+        research_output: The ResearchResult (or pre-rendered research text) to summarize
+        include_citations: Whether to include citations in the answer
+        cache: Cache to consult; defaults to the process-wide draft cache
+        cache_nondeterministic: Also cache answers drafted at a temperature above zero
+        on_event: Optional callback receiving ProgressEvent updates
+        token_budget: Estimated token budget for the sources of each map call
+        max_sources: Maximum number of sources summarized
+        chunk_size: Number of sources per map call
+        concurrency: Maximum number of map calls in flight at once
+
+    Yields:
+        Text chunks of the drafted answer
+    """
+    if not isinstance(research_output, ResearchResult):
+        yield from stream_draft_answer(
+            llm, research_output, include_citations=include_citations, cache=cache,
+            cache_nondeterministic=cache_nondeterministic, on_event=on_event,
+            token_budget=token_budget, max_sources=max_sources,
+        )
+        return
+
+    cache = _resolve_cache(llm, cache, cache_nondeterministic)
+    chunks = max(1, -(-min(len(research_output), max_sources or len(research_output)) // chunk_size))
+    packed = _pack(research_output, token_budget * chunks, max_sources, on_event)
+    instructions = f"{build_map_instructions(include_citations)}\n{build_reduce_instructions(include_citations)}"
+    key = draft_cache_key(
+        f"map-reduce:{chunk_size}\n{instructions}", packed.text, get_model_name(llm), getattr(llm, "temperature", None)
+    )
+
+    groups = -(-len(packed.sources) // chunk_size)
+    emit(on_event, DRAFTING_STARTED, f"Summarizing {groups} groups of sources in parallel...", groups=groups)
+    cached = cache.get(key) if cache is not None else None
+    annotate(cached=cached is not None)
+    if cached is not None:
+        emit(on_event, FIRST_TOKEN, "Serving cached answer", cached=True)
+        yield cached
+        emit(on_event, DONE, "Answer generation completed", word_count=len(cached.split()))
+        return
+
+    parts = []
+    for chunk in draft_flights.stream(
+        key, _stream_map_reduce_text, llm, packed.sources, include_citations, chunk_size, concurrency, key, cache
+    ):
+        if not parts:
+            emit(on_event, FIRST_TOKEN, "Receiving answer...", cached=False)
+        parts.append(chunk)
+        yield chunk
+    emit(on_event, DONE, "Answer generation completed", word_count=len("".join(parts).split()))
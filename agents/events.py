@@ -0,0 +1,26 @@
+from dataclasses import dataclass, field
+import time
+
+SEARCH_STARTED = "search_started"
+SOURCES_RECEIVED = "sources_received"
+CONTEXT_PACKED = "context_packed"
+DRAFTING_STARTED = "drafting_started"
+FIRST_TOKEN = "first_token"
+DONE = "done"
+# Carries one streamed chunk of the drafted answer in ``message``
+TOKEN = "token"
+
+
+@dataclass(frozen=True)
+class ProgressEvent:
+    """A pipeline milestone reported to progress subscribers such as the Streamlit status block."""
+    stage: str
+    message: str
+    data: dict = field(default_factory=dict)
+    timestamp: float = field(default_factory=time.time)
+
+
+def emit(on_event, stage, message, **data):
+    """Send a ProgressEvent to ``on_event`` if a subscriber was given."""
+    if on_event is not None:
+        on_event(ProgressEvent(stage, message, data))
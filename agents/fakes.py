@@ -0,0 +1,97 @@
+import re
+import threading
+import time
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+
+class FakeStreamingChatModel(BaseChatModel):
+    """
+    Chat model that answers without any network access.
+
+    Returns ``response`` when set, otherwise a short summary echoing the start of
+    the last message. Streaming yields the answer word by word. The first
+    ``failures`` calls raise a RuntimeError after their latency.
+    """
+
+    response: str = ""
+    model_name: str = "fake-chat"
+    temperature: float = 0.0
+    latency: float = 0.0
+    token_delay: float = 0.0
+    failures: int = 0
+    calls: int = 0
+
+    @property
+    def _llm_type(self):
+        return "fake-streaming-chat"
+
+    def _respond(self, messages):
+        if self.response:
+            return self.response
+        words = str(messages[-1].content).split()
+        return "Summary: " + " ".join(words[:40])
+
+    def _start_call(self):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self.calls <= self.failures:
+            raise RuntimeError(f"injected failure {self.calls}")
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        self._start_call()
+        message = AIMessage(content=self._respond(messages))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        self._start_call()
+        for token in re.findall(r"\S+\s*", self._respond(messages)):
+            if self.token_delay:
+                time.sleep(self.token_delay)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+
+class FakeSearchBackend:
+    """
+    Search backend returning synthetic results after an injected delay.
+
+    The first ``overlap`` results of every query share URLs, so merging several
+    queries exercises de-duplication. Every call is recorded in ``calls``. The
+    first ``failures`` calls raise a RuntimeError, and ``latencies`` overrides
+    ``latency`` for the first calls, e.g. ``[5.0]`` to make only the first one slow.
+    """
+
+    def __init__(self, latency=0.0, overlap=1, failures=0, latencies=()):
+        self.latency = latency
+        self.overlap = overlap
+        self.failures = failures
+        self.latencies = list(latencies)
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, query, max_results=5, search_depth="basic"):
+        with self._lock:
+            self.calls.append(query)
+            call = len(self.calls)
+        latency = self.latencies[call - 1] if call <= len(self.latencies) else self.latency
+        if latency:
+            time.sleep(latency)
+        if call <= self.failures:
+            raise RuntimeError(f"injected failure {call}")
+        slug = re.sub(r"\W+", "-", query.lower()).strip("-")
+        results = []
+        for i in range(max_results):
+            path = f"shared/{i}" if i < self.overlap else f"{slug}/{i}"
+            results.append({
+                "url": f"https://example.com/{path}",
+                "title": f"Result {i + 1} for {query}",
+                "content": f"Synthetic finding {i + 1} about {query}.",
+                "score": round(1.0 - i / (max_results + 1), 3),
+            })
+        return results
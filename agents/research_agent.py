@@ -1,9 +1,313 @@
 from langchain.agents import tool
-from langchain.tools.tavily_search import TavilySearchResults
+from agents.cache import build_cache
+from agents.clients import get_tavily_client
+from agents.resilience import RetryPolicy, get_breaker, resilient_call
+from agents.events import emit, SEARCH_STARTED, SOURCES_RECEIVED
+from agents.singleflight import SingleFlight
+from agents.sources import Source, ResearchResult
+from agents.tracing import add_usage, search_cost
+from langchain.schema import HumanMessage
+import asyncio
+import hashlib
+import inspect
+import os
+import re
+import threading
+import time
+
+SEARCH_CACHE_PATH = os.getenv("SEARCH_CACHE_PATH", os.path.join(".cache", "search.sqlite"))
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", 6 * 60 * 60))
+SEARCH_CONCURRENCY = int(os.getenv("SEARCH_CONCURRENCY", 4))
+SEARCH_TIMEOUT = float(os.getenv("SEARCH_TIMEOUT", 20))
+SEARCH_RETRIES = int(os.getenv("SEARCH_RETRIES", 3))
+# Seconds after which a slow search is duplicated and the first answer used (unset disables hedging)
+SEARCH_HEDGE_AFTER = float(os.environ["SEARCH_HEDGE_AFTER"]) if os.getenv("SEARCH_HEDGE_AFTER") else None
+
+# Angles used to widen a question into sub-queries when no planner LLM is given
+SUB_QUERY_TEMPLATES = [
+    "{query}",
+    "{query} latest developments",
+    "{query} statistics and data",
+    "{query} expert analysis",
+    "{query} challenges and criticism",
+]
+
+_search_cache = None
+_search_cache_lock = threading.Lock()
+# Concurrent searches for the same cache key share one backend call
+search_flights = SingleFlight()
+
+
+def get_search_cache():
+    """Return the process-wide search result cache, creating it on first use."""
+    global _search_cache
+    with _search_cache_lock:
+        if _search_cache is None:
+            _search_cache = build_cache(SEARCH_CACHE_PATH, ttl=SEARCH_CACHE_TTL)
+    return _search_cache
+
+
+
+def normalize_query(query):
+    """Lowercase, collapse whitespace and drop trailing punctuation so near-identical queries share a key."""
+    query = re.sub(r"\s+", " ", query.strip().lower())
+    return query.rstrip("?!. ")
+
+
+def search_cache_key(query, depth, max_sources, fan_out=False):
+    normalized = f"{normalize_query(query)}|{depth}|{max_sources}"
+    if fan_out:
+        normalized += "|fan-out"
+    return "search:" + hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def tavily_search(query, max_results=5, search_depth="basic"):
+    """Default search backend: a single Tavily query over the shared pooled client, returning result dicts."""
+    return get_tavily_client().search(query, max_results=max_results, search_depth=search_depth)
+
+
+def resilient_search(query, max_results=5, search_depth="basic"):
+    """
+    Default search backend: tavily_search behind a deadline, retries with jittered
+    backoff, the "tavily" circuit breaker and optional hedging.
+    """
+    return resilient_call(
+        tavily_search, query, max_results=max_results, search_depth=search_depth,
+        timeout=SEARCH_TIMEOUT, retry=RetryPolicy(attempts=SEARCH_RETRIES),
+        breaker=get_breaker("tavily"), hedge_after=SEARCH_HEDGE_AFTER,
+    )
+
+
+def to_sources(results, fetched_at=None):
+    """Convert backend result dicts into Source objects, stamping fresh results with one fetch time."""
+    fetched_at = fetched_at if fetched_at is not None else time.time()
+    return [Source.from_result(result, fetched_at) for result in results]
+
+
+def decompose_query(query, width, llm=None):
+    """
+    Split a question into up to ``width`` search queries, the original question first.
+
+    Args:
+        query: The research question
+        width: Number of sub-queries wanted
+        llm: Optional chat model used to plan the sub-queries; falls back to
+            fixed angles from SUB_QUERY_TEMPLATES when absent or unhelpful
+
+    Returns:
+        A list of distinct query strings
+    """
+    if width <= 1:
+        return [query]
+
+    queries = [query]
+    if llm is not None:
+        prompt = (
+            f"Write {width - 1} distinct web search queries that together cover different aspects "
+            f"of the question below. Return one query per line with no numbering.\n\n{query}"
+        )
+        for line in llm.invoke([HumanMessage(content=prompt)]).content.splitlines():
+            line = re.sub(r"^\s*(?:[-*]|\d+[.)])\s*", "", line).strip()
+            if line and normalize_query(line) not in {normalize_query(q) for q in queries}:
+                queries.append(line)
+
+    for template in SUB_QUERY_TEMPLATES[1:]:
+        if len(queries) >= width:
+            break
+        queries.append(template.format(query=query))
+    return queries[:width]
+
+
+def merge_results(result_lists, max_sources):
+    """
+    Interleave per-query Source lists by rank, dropping duplicate URLs.
+
+    Interleaving keeps the top hits of every sub-query ahead of the long tail of any single one.
+    """
+    merged = []
+    seen = set()
+    for rank in range(max((len(results) for results in result_lists), default=0)):
+        for results in result_lists:
+            if rank >= len(results) or results[rank].key in seen:
+                continue
+            seen.add(results[rank].key)
+            merged.append(results[rank])
+            if len(merged) == max_sources:
+                return merged
+    return merged
+
+
+async def _search_one(backend, query, max_results, search_depth, semaphore, timeout):
+    async with semaphore:
+        if inspect.iscoroutinefunction(backend):
+            call = backend(query, max_results=max_results, search_depth=search_depth)
+        else:
+            call = asyncio.to_thread(backend, query, max_results=max_results, search_depth=search_depth)
+        # The backend may retry, so the whole call gets every try's deadline plus the backoff between them
+        return await asyncio.wait_for(call, RetryPolicy(attempts=SEARCH_RETRIES).budget(timeout))
+
+
+async def gather_research(queries, backend, max_results=5, search_depth="basic",
+                          concurrency=SEARCH_CONCURRENCY, timeout=SEARCH_TIMEOUT):
+    """
+    Run several searches concurrently and merge their results.
+
+    Sub-queries that fail or run out of time are dropped; an error is raised
+    only when every one of them fails.
+
+    Args:
+        queries: Search queries to run
+        backend: Sync or async search callable ``(query, max_results, search_depth) -> list[dict]``
+        max_results: Results requested per query, and the size of the merged list
+        search_depth: Tavily search depth passed to the backend
+        concurrency: Maximum number of searches in flight at once
+        timeout: Per-try timeout in seconds; a search is abandoned once all SEARCH_RETRIES tries could have run
+
+    Returns:
+        The merged, de-duplicated list of Source objects
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    outcomes = await asyncio.gather(
+        *(_search_one(backend, q, max_results, search_depth, semaphore, timeout) for q in queries),
+        return_exceptions=True,
+    )
+    result_lists = [to_sources(outcome) for outcome in outcomes if not isinstance(outcome, BaseException)]
+    if not result_lists:
+        raise outcomes[0]
+    return merge_results(result_lists, max_results)
+
+
+def search_with_cache(query, depth=3, max_sources=5, backend=None, cache=None):
+    """
+    Run a single search query through the result cache, sharing the backend call with concurrent identical searches.
+
+    Returns:
+        A ``(sources, cached)`` tuple of Source objects and whether they came from the cache
+    """
+    backend = backend or resilient_search
+    cache = cache if cache is not None else get_search_cache()
+    key = search_cache_key(query, depth, max_sources)
+
+    results = cache.get(key) if cache is not None else None
+    if results is not None:
+        return to_sources(results), True
+
+    def fetch():
+        search_depth = "advanced" if depth >= 4 else "basic"
+        # Only the caller making the upstream call is charged for it
+        add_usage(cost=search_cost(search_depth))
+        sources = to_sources(backend(query, max_results=max_sources, search_depth=search_depth))
+        if cache is not None and sources:
+            cache.set(key, [source.to_dict() for source in sources])
+        return sources
+
+    return list(search_flights.do(key, fetch)), False
+
+
+def announce_search(queries, on_event):
+    if len(queries) > 1:
+        emit(on_event, SEARCH_STARTED, f"Searching the web across {len(queries)} queries...", queries=queries)
+    else:
+        emit(on_event, SEARCH_STARTED, "Searching the web for relevant information...", queries=queries)
+
+
+def announce_sources(results, cached, on_event):
+    emit(
+        on_event, SOURCES_RECEIVED,
+        f"Received {len(results)} sources" + (" (cached)" if cached else ""),
+        count=len(results), cached=cached,
+    )
+
+
+def run_web_research(query, depth=3, max_sources=5, backend=None, cache=None, on_event=None,
+                     fan_out=False, planner_llm=None, concurrency=SEARCH_CONCURRENCY, timeout=SEARCH_TIMEOUT):
+    """
+    Run a web search for a query, serving repeated queries from the result cache.
+
+    Concurrent calls for the same normalized query and settings share one search.
+
+    Args:
+        query: The research question
+        depth: Research depth (1-5); depths of 4 and above use Tavily's advanced search,
+            and in fan-out mode the depth is also the number of sub-queries
+        max_sources: Maximum number of results to request
+        backend: Search callable ``(query, max_results, search_depth) -> list[dict]``;
+            defaults to resilient_search
+        cache: Cache to consult; defaults to the process-wide search cache
+        on_event: Optional callback receiving ProgressEvent updates
+        fan_out: Decompose the question into sub-queries searched concurrently
+        planner_llm: Optional chat model used to write the sub-queries
+        concurrency: Maximum number of sub-queries in flight at once
+        timeout: Per-try timeout in seconds for fan-out searches
+
+    Returns:
+        A ResearchResult holding the sources found
+    """
+    backend = backend or resilient_search
+    cache = cache if cache is not None else get_search_cache()
+    key = search_cache_key(query, depth, max_sources, fan_out=fan_out)
+
+    results = cache.get(key) if cache is not None else None
+    cached = results is not None
+    if cached:
+        announce_search([query], on_event)
+        sources = to_sources(results)
+    else:
+        queries = decompose_query(query, depth if fan_out else 1, llm=planner_llm)
+        announce_search(queries, on_event)
+
+        def fetch():
+            search_depth = "advanced" if depth >= 4 else "basic"
+            add_usage(cost=search_cost(search_depth) * len(queries))
+            if len(queries) > 1:
+                sources = asyncio.run(gather_research(
+                    queries, backend, max_sources, search_depth, concurrency=concurrency, timeout=timeout
+                ))
+            else:
+                sources = to_sources(backend(query, max_results=max_sources, search_depth=search_depth))
+            if cache is not None and sources:
+                cache.set(key, [source.to_dict() for source in sources])
+            return sources
+
+        sources = list(search_flights.do(key, fetch))
+
+    announce_sources(sources, cached, on_event)
+    return ResearchResult(query, sources, cached)
+
+
+async def arun_web_research(query, depth=3, max_sources=5, backend=None, cache=None, on_event=None,
+                            fan_out=False, planner_llm=None, concurrency=SEARCH_CONCURRENCY, timeout=SEARCH_TIMEOUT):
+    """Async counterpart of run_web_research for callers already inside an event loop."""
+    backend = backend or resilient_search
+    cache = cache if cache is not None else get_search_cache()
+    key = search_cache_key(query, depth, max_sources, fan_out=fan_out)
+
+    results = cache.get(key) if cache is not None else None
+    cached = results is not None
+    if cached:
+        announce_search([query], on_event)
+        sources = to_sources(results)
+    else:
+        queries = await asyncio.to_thread(decompose_query, query, depth if fan_out else 1, planner_llm)
+        announce_search(queries, on_event)
+
+        async def fetch():
+            search_depth = "advanced" if depth >= 4 else "basic"
+            add_usage(cost=search_cost(search_depth) * len(queries))
+            sources = await gather_research(
+                queries, backend, max_sources, search_depth, concurrency=concurrency, timeout=timeout
+            )
+            if cache is not None and sources:
+                cache.set(key, [source.to_dict() for source in sources])
+            return sources
+
+        sources = list(await search_flights.ado(key, fetch))
+
+    announce_sources(sources, cached, on_event)
+    return ResearchResult(query, sources, cached)
+
 
 @tool
-def web_research_tool(query: str) -> str:
+def web_research_tool(query: str, depth: int = 3, max_sources: int = 5, fan_out: bool = False) -> ResearchResult:
     """Research the web for current information based on a query."""
-    search_tool = TavilySearchResults()
-    results = search_tool.run(query)
-    return results
+    return run_web_research(query, depth=depth, max_sources=max_sources, fan_out=fan_out)
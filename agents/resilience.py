@@ -0,0 +1,358 @@
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
+import asyncio
+import contextvars
+import queue
+import random
+import threading
+import time
+
+# Calls run on these threads so a deadline can abandon them; a timed-out call
+# keeps its thread until the provider finally answers
+_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="resilience")
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+# HTTP statuses worth retrying besides server errors: request timeout and rate limiting
+TRANSIENT_STATUSES = {408, 429}
+# Errors without a status that fail the same way on every try
+PERMANENT_ERRORS = (ValueError, TypeError, KeyError, AttributeError, NotImplementedError, PermissionError)
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a provider whose circuit breaker is open."""
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a call does not finish within its deadline."""
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter.
+
+    Args:
+        attempts: Total number of tries, including the first
+        base_delay: Upper bound in seconds of the wait before the first retry
+        max_delay: Cap on the upper bound as it doubles
+    """
+
+    def __init__(self, attempts=3, base_delay=0.5, max_delay=8.0):
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt):
+        """Seconds to wait after failed try number ``attempt`` (counting from 0)."""
+        return random.uniform(0, self._max_delay(attempt))
+
+    def budget(self, timeout):
+        """Longest time every try, each limited to ``timeout`` seconds, and the waits between them can take."""
+        return self.attempts * timeout + sum(self._max_delay(attempt) for attempt in range(self.attempts - 1))
+
+    def _max_delay(self, attempt):
+        return min(self.max_delay, self.base_delay * 2 ** attempt)
+
+
+def _status_code(exc):
+    for value in (
+        getattr(exc, "status_code", None),
+        getattr(exc, "code", None),
+        getattr(getattr(exc, "response", None), "status_code", None),
+    ):
+        if isinstance(value, int) and 100 <= value < 600:
+            return value
+    return None
+
+
+def is_transient(exc):
+    """
+    Whether a failed call may succeed if tried again.
+
+    Timeouts, connection errors, rate limiting and server errors are transient;
+    client errors such as a bad request, a rejected API key or an invalid
+    argument are not. Wrapped errors are judged by their cause, and errors that
+    carry no HTTP status are assumed transient.
+    """
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        seen.add(id(exc))
+        if isinstance(exc, (TimeoutError, ConnectionError)):
+            return True
+        status = _status_code(exc)
+        if status is not None:
+            return status >= 500 or status in TRANSIENT_STATUSES
+        if isinstance(exc, PERMANENT_ERRORS):
+            return False
+        exc = exc.__cause__ or exc.__context__
+    return True
+
+
+def _record_error(breaker, exc):
+    """Count a transient failure against the breaker; a client error still shows the provider answering."""
+    if breaker is None:
+        return
+    if is_transient(exc):
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+
+
+class CircuitBreaker:
+    """
+    Fails fast once a provider has failed ``failure_threshold`` times in a row.
+
+    After ``reset_timeout`` seconds one trial call is let through (half-open);
+    its success closes the circuit again and its failure re-opens it.
+
+    Args:
+        name: Provider name, used in error messages
+        failure_threshold: Consecutive failures that open the circuit
+        reset_timeout: Seconds the circuit stays open before a trial call
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow(self):
+        """Raise CircuitOpenError unless a call may go through now."""
+        with self._lock:
+            state = self.state
+            if state == self.CLOSED:
+                return
+            if state == self.HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return
+            retry_in = max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+            raise CircuitOpenError(f"{self.name} is unavailable; retrying in {retry_in:.0f}s")
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_running or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._trial_running = False
+
+
+def get_breaker(name, failure_threshold=5, reset_timeout=30.0):
+    """Return the process-wide circuit breaker for a provider, creating it on first use."""
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name, failure_threshold, reset_timeout)
+        return _breakers[name]
+
+
+def call_with_deadline(fn, timeout, *args, executor=None, **kwargs):
+    """
+    Run ``fn`` and raise DeadlineExceeded if it has not returned within ``timeout`` seconds.
+
+    ``executor`` is the pool the call runs on; callers that are themselves running on
+    the shared pool pass their own, so nested calls cannot starve it.
+    """
+    if timeout is None:
+        return fn(*args, **kwargs)
+    # Run in a copy of the caller's context so tracing and callback parents carry over
+    future = (executor or _executor).submit(contextvars.copy_context().run, fn, *args, **kwargs)
+    try:
+        return future.result(timeout=timeout)
+    except FutureTimeoutError:
+        future.cancel()
+        raise DeadlineExceeded(f"call did not finish within {timeout}s") from None
+
+
+def hedged_call(fn, hedge_after, timeout, *args, **kwargs):
+    """
+    Run ``fn``, starting an identical backup call if the first is still running after ``hedge_after`` seconds.
+
+    Returns whichever call succeeds first; raises only when both fail or the deadline passes.
+    """
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    pending = {_executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)}
+    done, pending = wait(pending, timeout=hedge_after)
+    if not done:
+        pending.add(_executor.submit(contextvars.copy_context().run, fn, *args, **kwargs))
+
+    error = None
+    while True:
+        for future in done:
+            if future.exception() is None:
+                for other in pending:
+                    other.cancel()
+                return future.result()
+            error = future.exception()
+        if not pending:
+            raise error
+        remaining = deadline - time.monotonic() if deadline is not None else None
+        if remaining is not None and remaining <= 0:
+            raise DeadlineExceeded(f"call did not finish within {timeout}s")
+        done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+
+
+def resilient_call(fn, *args, timeout=None, retry=None, breaker=None, hedge_after=None, **kwargs):
+    """
+    Call ``fn`` with a deadline, retries, a circuit breaker and optional hedging.
+
+    Args:
+        fn: The provider call
+        timeout: Deadline in seconds for each try (None waits indefinitely)
+        retry: RetryPolicy; None tries once
+        breaker: CircuitBreaker consulted before and updated after every try
+        hedge_after: Start a backup call when a try is still running after this many seconds
+
+    Only transient failures (see is_transient) are retried and counted by the
+    breaker; any other error is raised at once.
+
+    Returns:
+        The result of the first successful try
+    """
+    attempts = retry.attempts if retry is not None else 1
+    for attempt in range(attempts):
+        if breaker is not None:
+            breaker.allow()
+        try:
+            if hedge_after is not None:
+                result = hedged_call(fn, hedge_after, timeout, *args, **kwargs)
+            else:
+                result = call_with_deadline(fn, timeout, *args, **kwargs)
+        except Exception as exc:
+            _record_error(breaker, exc)
+            if attempt == attempts - 1 or not is_transient(exc):
+                raise
+            time.sleep(retry.delay(attempt))
+            continue
+        if breaker is not None:
+            breaker.record_success()
+        return result
+
+
+def _pump(make_stream, items, cancelled):
+    try:
+        for item in make_stream():
+            if cancelled.is_set():
+                return
+            items.put(("item", item))
+        items.put(("end", None))
+    except Exception as exc:
+        items.put(("error", exc))
+
+
+def resilient_stream(make_stream, timeout=None, retry=None, breaker=None, first_timeout=None, executor=None):
+    """
+    Iterate a provider stream with an idle deadline, retries and a circuit breaker.
+
+    A try that fails transiently or stalls for ``timeout`` seconds before yielding
+    anything is retried; once items have been yielded a failure is raised, since
+    the consumer has already seen partial output. As in resilient_call, other
+    errors are raised at once and not counted by the breaker.
+
+    Args:
+        make_stream: Zero-argument callable returning a fresh iterator for each try
+        timeout: Longest wait in seconds for any single item
+        retry: RetryPolicy; None tries once
+        breaker: CircuitBreaker consulted before and updated after every try
+        first_timeout: Longest wait for the first item, when it differs from ``timeout``
+        executor: Pool the stream is read on; defaults to the shared one
+
+    Yields:
+        The stream's items
+    """
+    attempts = retry.attempts if retry is not None else 1
+    for attempt in range(attempts):
+        if breaker is not None:
+            breaker.allow()
+        items, cancelled = queue.Queue(), threading.Event()
+        (executor or _executor).submit(contextvars.copy_context().run, _pump, make_stream, items, cancelled)
+        started = False
+        try:
+            while True:
+                wait_for = timeout if started or first_timeout is None else first_timeout
+                try:
+                    kind, payload = items.get(timeout=wait_for)
+                except queue.Empty:
+                    raise DeadlineExceeded(f"stream stalled for more than {wait_for}s") from None
+                if kind == "error":
+                    raise payload
+                if kind == "end":
+                    break
+                started = True
+                yield payload
+        except Exception as exc:
+            cancelled.set()
+            _record_error(breaker, exc)
+            if started or attempt == attempts - 1 or not is_transient(exc):
+                raise
+            time.sleep(retry.delay(attempt))
+            continue
+        finally:
+            cancelled.set()
+        if breaker is not None:
+            breaker.record_success()
+        return
+
+
+async def aresilient_stream(make_stream, timeout=None, retry=None, breaker=None, first_timeout=None):
+    """
+    Async counterpart of resilient_stream for async iterators, e.g. a chat model's ``astream``.
+
+    Args:
+        make_stream: Zero-argument callable returning a fresh async iterator for each try
+        timeout: Longest wait in seconds for any single item
+        retry: RetryPolicy; None tries once
+        breaker: CircuitBreaker consulted before and updated after every try
+        first_timeout: Longest wait for the first item, when it differs from ``timeout``
+
+    Yields:
+        The stream's items
+    """
+    attempts = retry.attempts if retry is not None else 1
+    for attempt in range(attempts):
+        if breaker is not None:
+            breaker.allow()
+        stream = make_stream()
+        started = False
+        try:
+            while True:
+                wait_for = timeout if started or first_timeout is None else first_timeout
+                try:
+                    item = await asyncio.wait_for(anext(stream), wait_for)
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError:
+                    raise DeadlineExceeded(f"stream stalled for more than {wait_for}s") from None
+                started = True
+                yield item
+        except Exception as exc:
+            _record_error(breaker, exc)
+            if started or attempt == attempts - 1 or not is_transient(exc):
+                raise
+            await asyncio.sleep(retry.delay(attempt))
+            continue
+        finally:
+            aclose = getattr(stream, "aclose", None)
+            if aclose is not None:
+                await aclose()
+        if breaker is not None:
+            breaker.record_success()
+        return
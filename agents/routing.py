@@ -0,0 +1,200 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Optional
+import math
+import os
+import threading
+import time
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from agents.context import estimate_tokens
+from agents.resilience import DeadlineExceeded, call_with_deadline, resilient_stream
+from agents.tracing import add_usage, annotate
+
+# Seconds a drafting model may take (to its first chunk when streaming) before the next route is tried
+DRAFT_LATENCY_BUDGET = float(os.getenv("DRAFT_LATENCY_BUDGET", 20))
+# Longest wait in seconds for the last route's answer, and for every chunk after the first
+ROUTE_TIMEOUT = float(os.getenv("DRAFT_TIMEOUT", 60))
+# Latency samples needed before a model's percentiles influence routing
+MIN_LATENCY_SAMPLES = 5
+
+# Route calls run on their own threads: the router is itself called from the shared
+# resilience pool, and nested calls on that pool could leave it waiting on itself
+_route_executor = ThreadPoolExecutor(max_workers=64, thread_name_prefix="drafting-route")
+
+
+def size_bucket(tokens):
+    """Group prompt sizes by power of two, so latencies are compared between similar inputs."""
+    return max(0, int(tokens) - 1).bit_length()
+
+
+class LatencyTracker:
+    """
+    Rolling window of call latencies per model, with percentile lookups.
+
+    Each sample is kept both for the model as a whole and for the model at the
+    prompt's size bucket, so routing can use latencies seen for similar inputs.
+
+    Args:
+        window: Number of most recent samples kept per model and per size bucket
+    """
+
+    def __init__(self, window=200):
+        self.window = window
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, model, seconds, tokens=None):
+        keys = [model] if tokens is None else [model, (model, size_bucket(tokens))]
+        with self._lock:
+            for key in keys:
+                self._samples.setdefault(key, deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, model, p, tokens=None):
+        """Return the ``p``-th percentile latency in seconds (nearest rank), or None without samples."""
+        key = model if tokens is None else (model, size_bucket(tokens))
+        with self._lock:
+            samples = sorted(self._samples.get(key, ()))
+        if not samples:
+            return None
+        return samples[max(0, math.ceil(p / 100 * len(samples)) - 1)]
+
+    def count(self, model, tokens=None):
+        key = model if tokens is None else (model, size_bucket(tokens))
+        with self._lock:
+            return len(self._samples.get(key, ()))
+
+    def summary(self):
+        """Return ``{model: {"count", "p50", "p95"}}`` for every model seen."""
+        with self._lock:
+            models = [key for key in self._samples if isinstance(key, str)]
+        return {
+            model: {"count": self.count(model), "p50": self.percentile(model, 50), "p95": self.percentile(model, 95)}
+            for model in models
+        }
+
+
+latency_tracker = LatencyTracker()
+
+
+@dataclass(slots=True)
+class ModelRoute:
+    """A model the router may send drafting requests to."""
+    name: str
+    llm: Any
+    # Largest prompt, in estimated tokens, this route should receive (None means no limit)
+    max_input_tokens: Optional[int] = None
+
+
+class DraftingRouter(BaseChatModel):
+    """
+    Chat model that routes each request to one of several models, falling back on timeout or error.
+
+    Routes are listed in order of preference. A request goes to the first route
+    that accepts its size and whose recorded p95 latency fits the latency budget;
+    when that route misses the budget (before its first chunk, when streaming) or
+    fails, the remaining eligible routes are tried in order, the last with
+    ``timeout`` as its deadline. Every successful call's latency is recorded for
+    later decisions.
+    """
+
+    routes: list[ModelRoute]
+    latency_budget: float = DRAFT_LATENCY_BUDGET
+    # Deadline of the last route, and longest gap between chunks once a stream has started
+    timeout: float = ROUTE_TIMEOUT
+    tracker: LatencyTracker = latency_tracker
+
+    @property
+    def _llm_type(self):
+        return "drafting-router"
+
+    @property
+    def model_name(self):
+        return "router:" + ",".join(route.name for route in self.routes)
+
+    @property
+    def temperature(self):
+        return getattr(self.routes[0].llm, "temperature", None)
+
+    @property
+    def deadline(self):
+        """Longest a call can take to answer (or start streaming): every route's budget, then the last one's timeout."""
+        return self.latency_budget * (len(self.routes) - 1) + self.timeout
+
+    def plan(self, messages):
+        """Return the routes to try for these messages, best first."""
+        return self._plan(self._input_tokens(messages))
+
+    @staticmethod
+    def _input_tokens(messages):
+        return sum(estimate_tokens(str(message.content)) for message in messages)
+
+    def _plan(self, tokens):
+        eligible = [
+            route for route in self.routes
+            if route.max_input_tokens is None or tokens <= route.max_input_tokens
+        ] or self.routes[-1:]
+
+        def within_budget(route):
+            # Prefer latencies seen for prompts of this size, then the model's overall ones
+            for size in (tokens, None):
+                if self.tracker.count(route.name, size) >= MIN_LATENCY_SAMPLES:
+                    return self.tracker.percentile(route.name, 95, size) <= self.latency_budget
+            return True
+
+        preferred = [route for route in eligible if within_budget(route)]
+        return preferred + [route for route in eligible if route not in preferred]
+
+    def _record_failure(self, route, exc, started, tokens):
+        add_usage(route_failures=1)
+        # A missed deadline is a lower bound on the model's latency; counting it
+        # lets a model that keeps timing out drop behind the fallbacks
+        if isinstance(exc, DeadlineExceeded):
+            self.tracker.record(route.name, time.perf_counter() - started, tokens)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        tokens = self._input_tokens(messages)
+        routes = self._plan(tokens)
+        for i, route in enumerate(routes):
+            timeout = self.latency_budget if i < len(routes) - 1 else self.timeout
+            started = time.perf_counter()
+            try:
+                message = call_with_deadline(route.llm.invoke, timeout, messages, executor=_route_executor)
+            except Exception as exc:
+                self._record_failure(route, exc, started, tokens)
+                if i == len(routes) - 1:
+                    raise
+                continue
+            self.tracker.record(route.name, time.perf_counter() - started, tokens)
+            annotate(model=route.name)
+            return ChatResult(generations=[ChatGeneration(message=message, generation_info={"model": route.name})])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        tokens = self._input_tokens(messages)
+        routes = self._plan(tokens)
+        for i, route in enumerate(routes):
+            first_timeout = self.latency_budget if i < len(routes) - 1 else self.timeout
+            started = time.perf_counter()
+            chunks = resilient_stream(
+                lambda llm=route.llm: llm.stream(messages),
+                timeout=self.timeout, first_timeout=first_timeout, executor=_route_executor,
+            )
+            try:
+                first = next(chunks)
+            except StopIteration:
+                return
+            except Exception as exc:
+                self._record_failure(route, exc, started, tokens)
+                if i == len(routes) - 1:
+                    raise
+                continue
+            self.tracker.record(route.name, time.perf_counter() - started, tokens)
+            annotate(model=route.name)
+            yield ChatGenerationChunk(message=first, generation_info={"model": route.name})
+            # The budget covers time to the first chunk; later chunks only have to arrive within `timeout` of each other
+            for message in chunks:
+                yield ChatGenerationChunk(message=message)
+            return
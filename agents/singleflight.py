@@ -0,0 +1,138 @@
+from concurrent.futures import Future
+import asyncio
+import threading
+
+from agents.tracing import add_usage
+
+
+class _Abandoned(Exception):
+    """Set on a flight whose leader stopped without a result, so a waiting caller takes over."""
+
+
+class SingleFlight:
+    """
+    Shares one upstream call among concurrent callers asking for the same key.
+
+    The first caller for a key (the leader) makes the call; callers arriving while
+    it is in flight wait for its result, or its exception, instead of making their
+    own. Threads and asyncio tasks share flights: each key's result is a
+    ``concurrent.futures.Future`` that threads block on and tasks await. Once a
+    flight lands the key is free again, so later callers start a new one (results
+    are kept by the caches, not here).
+
+    A streaming leader whose consumer stops early leaves no result; one of the
+    waiting callers then becomes the leader and makes the call itself.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.coalesced = 0
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def _join(self, key):
+        with self._lock:
+            future = self._flights.get(key)
+            leader = future is None
+            if leader:
+                future = self._flights[key] = Future()
+                self.calls += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            add_usage(coalesced=1)
+        return future, leader
+
+    def _land(self, key, future, result=None, error=None):
+        with self._lock:
+            self._flights.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, key, fn, *args, **kwargs):
+        """Return ``fn(*args, **kwargs)``, shared with concurrent calls for ``key``."""
+        while True:
+            future, leader = self._join(key)
+            if not leader:
+                try:
+                    return future.result()
+                except _Abandoned:
+                    continue
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException as exc:
+                self._land(key, future, error=exc if isinstance(exc, Exception) else _Abandoned())
+                raise
+            self._land(key, future, result)
+            return result
+
+    async def ado(self, key, fn, *args, **kwargs):
+        """Return ``await fn(*args, **kwargs)``, shared with concurrent calls for ``key``."""
+        while True:
+            future, leader = self._join(key)
+            if not leader:
+                try:
+                    return await asyncio.wrap_future(future)
+                except _Abandoned:
+                    continue
+            try:
+                result = await fn(*args, **kwargs)
+            except BaseException as exc:
+                self._land(key, future, error=exc if isinstance(exc, Exception) else _Abandoned())
+                raise
+            self._land(key, future, result)
+            return result
+
+    def stream(self, key, fn, *args, **kwargs):
+        """
+        Yield the text chunks of ``fn(*args, **kwargs)``, shared with concurrent streams for ``key``.
+
+        The leader yields chunks as they arrive; callers that joined its flight
+        receive the whole text as one chunk once it is complete.
+        """
+        while True:
+            future, leader = self._join(key)
+            if not leader:
+                try:
+                    yield future.result()
+                    return
+                except _Abandoned:
+                    continue
+            parts = []
+            try:
+                for chunk in fn(*args, **kwargs):
+                    parts.append(chunk)
+                    yield chunk
+            except BaseException as exc:
+                self._land(key, future, error=exc if isinstance(exc, Exception) else _Abandoned())
+                raise
+            self._land(key, future, "".join(parts))
+            return
+
+    async def astream(self, key, fn, *args, **kwargs):
+        """Async iterator counterpart of ``stream`` for an async generator function ``fn``."""
+        while True:
+            future, leader = self._join(key)
+            if not leader:
+                try:
+                    yield await asyncio.wrap_future(future)
+                    return
+                except _Abandoned:
+                    continue
+            parts = []
+            try:
+                async for chunk in fn(*args, **kwargs):
+                    parts.append(chunk)
+                    yield chunk
+            except BaseException as exc:
+                self._land(key, future, error=exc if isinstance(exc, Exception) else _Abandoned())
+                raise
+            self._land(key, future, "".join(parts))
+            return
+
+    def stats(self):
+        """Return the number of upstream calls made and of callers that shared another's call."""
+        with self._lock:
+            return {"calls": self.calls, "coalesced": self.coalesced, "in_flight": len(self._flights)}
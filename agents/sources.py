@@ -0,0 +1,82 @@
+from dataclasses import dataclass, field
+import time
+
+
+@dataclass(slots=True, frozen=True)
+class Source:
+    """One search hit as returned by a search backend."""
+    url: str
+    title: str = ""
+    snippet: str = ""
+    score: float = 0.0
+    fetched_at: float = field(default_factory=time.time)
+
+    @classmethod
+    def from_result(cls, result, fetched_at=None):
+        """
+        Build a Source from a backend result dict (Tavily's ``url``/``title``/``content``/``score``).
+
+        A ``fetched_at`` stored in the dict, as in cached results, wins over the one given.
+        """
+        return cls(
+            url=result.get("url", "unknown"),
+            title=result.get("title", ""),
+            snippet=result.get("content", result.get("snippet", "")),
+            score=float(result.get("score") or 0.0),
+            fetched_at=result.get("fetched_at") or fetched_at or time.time(),
+        )
+
+    @property
+    def key(self):
+        """URL without fragment or trailing slash, used to spot the same page returned twice."""
+        return self.url.split("#")[0].rstrip("/")
+
+    def to_dict(self):
+        return {
+            "url": self.url,
+            "title": self.title,
+            "content": self.snippet,
+            "score": self.score,
+            "fetched_at": self.fetched_at,
+        }
+
+    def to_text(self):
+        return f"Source: {self.url}\n{self.snippet}"
+
+
+@dataclass(slots=True)
+class ResearchResult:
+    """
+    The sources gathered for one research question.
+
+    The text handed to the drafting model is rendered from the sources only when
+    asked for, via ``to_text``.
+    """
+    query: str
+    sources: list[Source] = field(default_factory=list)
+    cached: bool = False
+
+    def __len__(self):
+        return len(self.sources)
+
+    def __str__(self):
+        return self.to_text()
+
+    def to_text(self):
+        """Render the sources as the text block handed to the drafting agent."""
+        return "\n\n".join(source.to_text() for source in self.sources)
+
+    def to_dict(self):
+        return {
+            "query": self.query,
+            "sources": [source.to_dict() for source in self.sources],
+            "cached": self.cached,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            query=data["query"],
+            sources=[Source.from_result(source) for source in data.get("sources", [])],
+            cached=data.get("cached", False),
+        )
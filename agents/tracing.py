@@ -0,0 +1,249 @@
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+import contextvars
+import json
+import math
+import os
+import threading
+import time
+import uuid
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:
+    otel_trace = None
+
+# JSONL file finished spans are appended to (empty disables the export)
+TRACE_PATH = os.getenv("TRACE_PATH", os.path.join(".data", "traces.jsonl"))
+# Also report spans through OpenTelemetry when its SDK is installed and configured
+TRACE_OTEL = os.getenv("TRACE_OTEL", "").lower() in ("1", "true", "yes")
+
+# Estimated USD per million input and output tokens
+MODEL_PRICES = {
+    "gemini-2.0-flash": (0.10, 0.40),
+    "gemini-2.0-flash-lite": (0.075, 0.30),
+}
+# Estimated USD per Tavily API credit; a basic search costs 1 credit, an advanced one 2
+SEARCH_CREDIT_COST = float(os.getenv("SEARCH_CREDIT_COST", 0.008))
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+_current_otel_span = contextvars.ContextVar("current_otel_span", default=None)
+_tracer = None
+_tracer_lock = threading.Lock()
+
+
+def estimate_cost(model, input_tokens=0, output_tokens=0):
+    """Estimate the USD cost of a model call; unknown models cost 0."""
+    input_price, output_price = MODEL_PRICES.get(model, (0.0, 0.0))
+    return (input_tokens * input_price + output_tokens * output_price) / 1_000_000
+
+
+def search_cost(search_depth="basic"):
+    return SEARCH_CREDIT_COST * (2 if search_depth == "advanced" else 1)
+
+
+@dataclass(slots=True)
+class Span:
+    """One timed stage of a research run."""
+    name: str
+    trace_id: str
+    span_id: str = field(default_factory=lambda: uuid.uuid4().hex[:16])
+    parent_id: str = None
+    start_time: float = field(default_factory=time.time)
+    duration_ms: float = None
+    status: str = "ok"
+    attributes: dict = field(default_factory=dict)
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def add(self, **amounts):
+        """Add to numeric attributes, e.g. token counts of several model calls in one stage."""
+        for key, amount in amounts.items():
+            self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_time": self.start_time,
+            "duration_ms": self.duration_ms,
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+class JsonlExporter:
+    """Append finished spans to a JSONL file, one object per line."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def export(self, span):
+        line = json.dumps(span.to_dict(), default=str) + "\n"
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+
+class Tracer:
+    """
+    Records nested, timed spans around pipeline stages and hands them to exporters.
+
+    The active span follows the context, so spans opened in graph nodes and in
+    threads started with a copied context nest under the span that was active
+    when the work began.
+
+    Args:
+        exporters: Objects with an ``export(span)`` method, called as each span finishes
+        otel: Mirror spans into OpenTelemetry (requires the opentelemetry package)
+    """
+
+    def __init__(self, exporters=(), otel=False):
+        self.exporters = list(exporters)
+        self._otel = otel_trace.get_tracer("deep-research") if otel and otel_trace is not None else None
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """Time the enclosed block as a span, making it the active span while it runs."""
+        parent = _current_span.get()
+        span = Span(name, parent.trace_id if parent else uuid.uuid4().hex, parent_id=parent.span_id if parent else None)
+        span.set(**attributes)
+        token = _current_span.set(span)
+        started = time.perf_counter()
+        otel_span = otel_token = None
+        if self._otel is not None:
+            parent_otel = _current_otel_span.get()
+            context = otel_trace.set_span_in_context(parent_otel) if parent_otel is not None else None
+            otel_span = self._otel.start_span(name, context=context)
+            otel_token = _current_otel_span.set(otel_span)
+        try:
+            yield span
+        except BaseException as exc:
+            # GeneratorExit means a consumer stopped early, not that the stage failed
+            if not isinstance(exc, GeneratorExit):
+                span.status = "error"
+                span.set(error=f"{type(exc).__name__}: {exc}")
+            raise
+        finally:
+            span.duration_ms = (time.perf_counter() - started) * 1000
+            try:
+                _current_span.reset(token)
+                if otel_token is not None:
+                    _current_otel_span.reset(otel_token)
+            except ValueError:
+                # A generator holding the span was closed from another context
+                pass
+            self._finish(span, otel_span)
+
+    def _finish(self, span, otel_span):
+        if "model" in span.attributes and "input_tokens" in span.attributes:
+            span.add(cost=estimate_cost(
+                span.attributes["model"], span.attributes["input_tokens"], span.attributes.get("output_tokens", 0)
+            ))
+        if otel_span is not None:
+            for key, value in span.attributes.items():
+                otel_span.set_attribute(key, value if isinstance(value, (str, bool, int, float)) else str(value))
+            if span.status == "error":
+                otel_span.set_status(otel_trace.Status(otel_trace.StatusCode.ERROR))
+            otel_span.end()
+        for exporter in self.exporters:
+            exporter.export(span)
+
+
+def annotate(**attributes):
+    """Set attributes on the active span, if any."""
+    span = _current_span.get()
+    if span is not None:
+        span.set(**attributes)
+
+
+def add_usage(**amounts):
+    """Add token counts or costs to the active span, if any."""
+    span = _current_span.get()
+    if span is not None:
+        span.add(**amounts)
+
+
+def get_tracer():
+    """Return the process-wide tracer, exporting to TRACE_PATH, creating it on first use."""
+    global _tracer
+    with _tracer_lock:
+        if _tracer is None:
+            _tracer = Tracer([JsonlExporter(TRACE_PATH)] if TRACE_PATH else [], otel=TRACE_OTEL)
+    return _tracer
+
+
+def set_tracer(tracer):
+    """Replace the process-wide tracer."""
+    global _tracer
+    with _tracer_lock:
+        _tracer = tracer
+
+
+def read_spans(path=None, limit=5000):
+    """
+    Read the most recent finished spans from a JSONL trace file.
+
+    Only the end of the file is read, so the cost does not grow with its age.
+
+    Args:
+        path: Trace file; defaults to TRACE_PATH
+        limit: Maximum number of spans returned
+
+    Returns:
+        Span dicts, oldest first
+    """
+    path = path or TRACE_PATH
+    if not path or not os.path.exists(path):
+        return []
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        end, block, data = f.tell(), 64 * 1024, b""
+        while end > 0 and data.count(b"\n") <= limit:
+            step = min(block, end)
+            end -= step
+            f.seek(end)
+            data = f.read(step) + data
+    lines = data.splitlines()[-limit:] if end == 0 else data.splitlines()[1:][-limit:]
+    spans = []
+    for line in lines:
+        try:
+            spans.append(json.loads(line))
+        except ValueError:
+            continue
+    return spans
+
+
+def _percentile(values, p):
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+def stage_latencies(spans):
+    """
+    Summarize spans per stage.
+
+    Returns:
+        ``{name: {"count", "p50_ms", "p95_ms", "cost"}}``, where cost is the total estimated USD
+    """
+    durations, costs = {}, {}
+    for span in spans:
+        if span.get("duration_ms") is None:
+            continue
+        durations.setdefault(span["name"], []).append(span["duration_ms"])
+        costs[span["name"]] = costs.get(span["name"], 0.0) + span.get("attributes", {}).get("cost", 0.0)
+    summary = {}
+    for name, values in durations.items():
+        values.sort()
+        summary[name] = {
+            "count": len(values),
+            "p50_ms": _percentile(values, 50),
+            "p95_ms": _percentile(values, 95),
+            "cost": costs[name],
+        }
+    return summary
@@ -0,0 +1,293 @@
+"""
+Headless HTTP API for the research pipeline.
+
+Endpoints:
+    POST /research                 Start a research run; returns its id at once
+    GET  /research/{id}            Status, answer so far and sources of a run
+    GET  /research/{id}/events     Server-sent events: progress, answer tokens, then done or error
+    GET  /history                  Search saved research (same store as the Streamlit UI)
+    GET  /history/{research_id}    One saved research entry
+    GET  /metrics                  Dashboard metrics
+
+Runs are asyncio tasks in the server process, so many can be in flight at once.
+
+Usage:
+    uvicorn api.server:create_app --factory --port 8000
+    python -m api.server --fake     # serve with fake search and drafting providers, no API keys needed
+"""
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Optional
+import argparse
+import asyncio
+import json
+import os
+import time
+import uuid
+
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+
+from agents.context import DRAFT_TOKEN_BUDGET
+from agents.drafting_agent import astream_draft_answer, draft_flights, get_drafting_llm, get_model_name
+from agents.research_agent import arun_web_research, resilient_search, search_flights
+from agents.tracing import get_tracer
+from storage.history import build_history_entry, serialize_entry
+from storage.history_store import get_history_store
+
+# Threads for blocking work (the Tavily client, history writes); bounds how many searches run at once
+API_THREADS = int(os.getenv("API_THREADS", 64))
+# Finished runs kept for status and event replay before the oldest are forgotten
+MAX_FINISHED_RUNS = 500
+# Seconds between keep-alive comments on an idle event stream
+SSE_KEEPALIVE = 15
+
+
+class ResearchRequest(BaseModel):
+    query: str = Field(min_length=1)
+    depth: int = Field(3, ge=1, le=5)
+    max_sources: int = Field(5, ge=1, le=10)
+    include_citations: bool = True
+    cache_drafts: bool = False
+    token_budget: int = Field(DRAFT_TOKEN_BUDGET, ge=100)
+
+
+class ResearchRun:
+    """
+    One research request and every event it has published.
+
+    Events are kept so a client subscribing late, or reconnecting, receives the
+    run from its start.
+    """
+
+    def __init__(self, request):
+        self.id = uuid.uuid4().hex
+        self.request = request
+        self.status = "running"
+        self.submitted_at = time.time()
+        self.finished_at = None
+        self.answer = ""
+        self.sources = []
+        self.research_id = None
+        self.error = None
+        self.events = []
+        # Set, then replaced, whenever an event is published; followers wait on the current one
+        self._changed = asyncio.Event()
+
+    @property
+    def done(self):
+        return self.status != "running"
+
+    def publish(self, event, data, status=None):
+        """Append an event and wake followers; must be called on the event loop's thread."""
+        self.events.append((event, data))
+        # The final event and the status change land together, so followers never stop before it
+        if status is not None:
+            self.status = status
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    def finish(self, status, error=None):
+        self.error = error
+        self.finished_at = time.time()
+        data = {**self.to_dict(include_answer=False), "status": status}
+        self.publish("done" if status == "succeeded" else "error", data, status=status)
+
+    async def follow(self, keepalive=SSE_KEEPALIVE):
+        """Yield ``(event, data)`` pairs from the first one until the run finishes; None marks an idle interval."""
+        position = 0
+        while True:
+            while position < len(self.events):
+                position += 1
+                yield self.events[position - 1]
+            if self.done:
+                return
+            try:
+                await asyncio.wait_for(self._changed.wait(), keepalive)
+            except asyncio.TimeoutError:
+                yield None
+
+    def to_dict(self, include_answer=True):
+        data = {
+            "id": self.id,
+            "query": self.request.query,
+            "status": self.status,
+            "submitted_at": self.submitted_at,
+            "finished_at": self.finished_at,
+            "research_id": self.research_id,
+            "error": self.error,
+        }
+        if include_answer:
+            data["answer"] = self.answer
+            data["sources"] = self.sources
+        return data
+
+
+def format_sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def create_app(llm=None, search_backend=None, history_store=None, search_cache=None, draft_cache=None):
+    """
+    Build the API around one set of shared clients and stores.
+
+    Args:
+        llm: Drafting model; defaults to get_drafting_llm()
+        search_backend: Search callable; defaults to resilient_search over the pooled Tavily client
+        history_store: History store; defaults to the process-wide one the UI also uses
+        search_cache: Search result cache; defaults to the process-wide one
+        draft_cache: Drafted-answer cache; defaults to the process-wide one
+
+    Returns:
+        The FastAPI application
+    """
+    @asynccontextmanager
+    async def lifespan(_):
+        executor = ThreadPoolExecutor(max_workers=API_THREADS, thread_name_prefix="api")
+        asyncio.get_running_loop().set_default_executor(executor)
+        yield
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    api = FastAPI(title="Deep Research API", lifespan=lifespan)
+    llm = llm or get_drafting_llm()
+    search_backend = search_backend or resilient_search
+    history_store = history_store or get_history_store()
+    runs = {}
+
+    async def run_research(run):
+        request = run.request
+
+        loop = asyncio.get_running_loop()
+
+        def on_event(event):
+            data = {"stage": event.stage, "message": event.message, "data": event.data}
+            try:
+                on_loop = asyncio.get_running_loop() is loop
+            except RuntimeError:
+                on_loop = False
+            # Publishing in place keeps progress events in order with the tokens and the final event
+            if on_loop:
+                run.publish("progress", data)
+            else:
+                loop.call_soon_threadsafe(run.publish, "progress", data)
+
+        try:
+            with get_tracer().span("research", query=request.query, depth=request.depth, source="api"):
+                with get_tracer().span("search", query=request.query) as span:
+                    research = await arun_web_research(
+                        request.query, depth=request.depth, max_sources=request.max_sources,
+                        backend=search_backend, cache=search_cache, on_event=on_event, fan_out=True,
+                    )
+                    span.set(sources=len(research), cached=research.cached)
+                run.sources = [source.to_dict() for source in research.sources]
+
+                with get_tracer().span("drafting", mode="single", model=get_model_name(llm)):
+                    async for token in astream_draft_answer(
+                        llm, research, include_citations=request.include_citations, cache=draft_cache,
+                        cache_nondeterministic=request.cache_drafts, on_event=on_event,
+                        token_budget=request.token_budget, max_sources=request.max_sources,
+                    ):
+                        run.answer += token
+                        run.publish("token", {"text": token})
+
+                with get_tracer().span("history_save"):
+                    entry = build_history_entry(request.query, research, run.answer)
+                    run.research_id = await asyncio.to_thread(history_store.add, entry)
+        except Exception as exc:
+            run.finish("failed", str(exc) or type(exc).__name__)
+            return
+        run.finish("succeeded")
+
+    def prune():
+        finished = sorted((run for run in runs.values() if run.done), key=lambda run: run.finished_at)
+        for run in finished[:max(0, len(finished) - MAX_FINISHED_RUNS)]:
+            del runs[run.id]
+
+    def get_run(run_id):
+        run = runs.get(run_id)
+        if run is None:
+            raise HTTPException(status_code=404, detail="Unknown research run")
+        return run
+
+    @api.post("/research", status_code=202)
+    async def submit_research(request: ResearchRequest):
+        run = ResearchRun(request)
+        runs[run.id] = run
+        prune()
+        run.task = asyncio.create_task(run_research(run))
+        return {
+            "id": run.id,
+            "status": run.status,
+            "status_url": f"/research/{run.id}",
+            "events_url": f"/research/{run.id}/events",
+        }
+
+    @api.get("/research/{run_id}")
+    async def research_status(run_id: str):
+        return get_run(run_id).to_dict()
+
+    @api.get("/research/{run_id}/events")
+    async def research_events(run_id: str):
+        run = get_run(run_id)
+
+        async def stream():
+            async for item in run.follow():
+                yield ": keep-alive\n\n" if item is None else format_sse(*item)
+
+        return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+    @api.get("/history")
+    def history(search: str = "", tags: Optional[list[str]] = Query(None), bookmarked: bool = False,
+                offset: int = Query(0, ge=0), limit: int = Query(20, ge=1, le=100)):
+        items, total = history_store.search(
+            search_term=search, selected_tags=tags, bookmarked_only=bookmarked, offset=offset, limit=limit
+        )
+        return {"items": [serialize_entry(item) for item in items], "total": total}
+
+    @api.get("/history/{research_id}")
+    def history_entry(research_id: str):
+        item = history_store.get(research_id)
+        if item is None:
+            raise HTTPException(status_code=404, detail="Unknown research id")
+        return serialize_entry(item)
+
+    @api.get("/metrics")
+    def metrics():
+        return history_store.metrics()
+
+    @api.get("/health")
+    async def health():
+        return {
+            "status": "ok",
+            "running": sum(not run.done for run in runs.values()),
+            "coalesced": {"search": search_flights.stats(), "drafting": draft_flights.stats()},
+        }
+
+    return api
+
+
+def create_fake_app(**kwargs):
+    """Build the API over fake search and drafting providers, for local testing without API keys."""
+    from agents.fakes import FakeSearchBackend, FakeStreamingChatModel
+
+    return create_app(
+        llm=FakeStreamingChatModel(latency=0.5, token_delay=0.02),
+        search_backend=FakeSearchBackend(latency=0.3),
+        **kwargs,
+    )
+
+
+def main(argv=None):
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve the research pipeline over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--fake", action="store_true", help="Use fake search and drafting providers")
+    args = parser.parse_args(argv)
+    uvicorn.run(create_fake_app() if args.fake else create_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,19 @@
 import streamlit as st
-from agents.research_agent import web_research_tool
-from agents.drafting_agent import get_drafting_llm, draft_answer
+from agents.research_agent import get_search_cache
+from agents.drafting_agent import get_draft_cache, DRAFT_MODES
+from agents.context import DRAFT_TOKEN_BUDGET
+from agents.events import SEARCH_STARTED, SOURCES_RECEIVED, CONTEXT_PACKED, DRAFTING_STARTED, FIRST_TOKEN, DONE
+from agents.tracing import get_tracer, read_spans, stage_latencies
+from graph.workflow import get_workflow
+from graph.jobs import JobManager, JobStatus
+from storage.history import build_history_entry
+from storage.history_store import get_history_store
+from storage.embeddings import get_semantic_index, SIMILARITY_THRESHOLD
+from storage.export import FORMATS, available_formats, date_range, export_history, import_history
 from dotenv import load_dotenv
-import time
-import json
+import tempfile
+import uuid
+from functools import partial
 import pandas as pd
 from datetime import datetime
 import plotly.express as px
@@ -180,23 +190,79 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# Share of the progress bar reached at each pipeline stage
+STAGE_PROGRESS = {
+    SEARCH_STARTED: 10,
+    SOURCES_RECEIVED: 50,
+    CONTEXT_PACKED: 55,
+    DRAFTING_STARTED: 60,
+    FIRST_TOKEN: 70,
+    DONE: 100,
+}
+
+# Default number of My Research entries shown per page
+HISTORY_PAGE_SIZE = 20
+# Seconds between refreshes of the research panel while jobs are running
+JOB_POLL_INTERVAL = 1
+
+JOB_STATUS_ICONS = {
+    JobStatus.QUEUED: "⏳",
+    JobStatus.RUNNING: "🔎",
+    JobStatus.SUCCEEDED: "✅",
+    JobStatus.FAILED: "❌",
+    JobStatus.CANCELLED: "🚫",
+}
+
+@st.cache_resource(show_spinner=False)
+def load_stores():
+    """Open the history store and semantic index once per server process"""
+    history_store = get_history_store()
+    semantic_index = get_semantic_index()
+    if len(semantic_index.vectors) != history_store.count():
+        # Index history saved before the semantic index existed, or drop stale vectors
+        if len(semantic_index.vectors) > history_store.count():
+            semantic_index.clear()
+        semantic_index.sync(history_store)
+    return history_store, semantic_index
+
+@st.cache_resource(show_spinner=False)
+def load_workflow():
+    """Compile the research workflow once per server process, sharing its pooled Gemini and Tavily clients across sessions"""
+    return get_workflow()
+
+@st.cache_resource(show_spinner=False)
+def load_jobs():
+    """Start the background research job pool once per server process; finished jobs are saved to history"""
+    return JobManager(workflow=load_workflow(), on_complete=save_job_to_history)
+
+history_store, semantic_index = load_stores()
+
 # Initialize session state
-if "history" not in st.session_state:
-    st.session_state.history = []
-if "is_researching" not in st.session_state:
-    st.session_state.is_researching = False
-if "current_step" not in st.session_state:
-    st.session_state.current_step = None
-if "bookmarks" not in st.session_state:
-    st.session_state.bookmarks = []
-if "tags" not in st.session_state:
-    st.session_state.tags = []
+if "recent_history" not in st.session_state:
+    # Lightweight summaries of the latest entries; full bodies stay in the history store
+    st.session_state.recent_history = history_store.list_summaries(limit=3)
+if "history_page" not in st.session_state:
+    st.session_state.history_page = 0
+if "opened_ids" not in st.session_state:
+    # Entries whose full answer and research bodies have been loaded on My Research
+    st.session_state.opened_ids = set()
+if "session_key" not in st.session_state:
+    # Identifies this browser session's research jobs in the shared job pool
+    st.session_state.session_key = uuid.uuid4().hex
+if "active_job_id" not in st.session_state:
+    # The research job whose progress and results are shown on the Research page
+    st.session_state.active_job_id = None
 if "settings" not in st.session_state:
     st.session_state.settings = {
         "research_depth": 3,
         "include_citations": True,
         "theme": "light",
-        "max_sources": 5
+        "max_sources": 5,
+        "cache_drafts": False,
+        "similarity_threshold": SIMILARITY_THRESHOLD,
+        "token_budget": DRAFT_TOKEN_BUDGET,
+        "draft_mode": "single",
+        "history_page_size": HISTORY_PAGE_SIZE
     }
 if "search_query" not in st.session_state:
     st.session_state.search_query = ""
@@ -207,143 +273,252 @@ if "nav_option" not in st.session_state:
 
 
 # Helper functions
-def generate_unique_id():
-    """Generate a simple timestamp-based ID"""
-    return int(datetime.now().timestamp() * 1000)
-
-def save_research_to_history(query, research_result, final_answer):
-    """Save research results to history with metadata"""
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    research_id = generate_unique_id()
-    
-    # Extract possible tags from query
-    possible_tags = [word.lower() for word in query.split() 
-                    if len(word) > 4 and word.lower() not in ["what", "where", "when", "which", "how", "does", "the", "and", "that", "this"]]
-    
-    # Take up to 3 most relevant tags
-    suggested_tags = possible_tags[:3] if possible_tags else ["research"]
-    
-    # Add to history
-    new_entry = {
-        "id": research_id,
-        "query": query,
-        "research": research_result,
-        "answer": final_answer,
-        "timestamp": timestamp,
-        "date_obj": datetime.now(),
-        "tags": suggested_tags,
-        "bookmarked": False,
-        "word_count": len(final_answer.split()),
-        "sources_count": research_result.count("Source:"),
-    }
-    
-    st.session_state.history.append(new_entry)
-    
-    # Update tag collection
-    for tag in suggested_tags:
-        if tag not in st.session_state.tags:
-            st.session_state.tags.append(tag)
-    
+def refresh_recent_history():
+    """Reload the summaries of the latest research shown on the Research page"""
+    st.session_state.recent_history = history_store.list_summaries(limit=3)
+
+def save_job_to_history(job):
+    """Save a finished research job to history with metadata; runs on the job's worker thread"""
+    with get_tracer().span("history_save"):
+        new_entry = build_history_entry(job.query, job.research_output, job.answer)
+        research_id = history_store.add(new_entry)
+        semantic_index.add(research_id, job.query)
     return research_id
 
+def find_previous_research(query):
+    """Return the stored research whose query is most similar to this one, with its similarity, if above the threshold"""
+    matches = semantic_index.find_similar(query, threshold=st.session_state.settings["similarity_threshold"], k=1)
+    for research_id, similarity in matches:
+        item = history_store.get(research_id)
+        if item is not None:
+            return item, similarity
+    return None, 0.0
+
 def bookmark_research(research_id, status=True):
     """Bookmark or unbookmark a research item"""
-    for item in st.session_state.history:
-        if item["id"] == research_id:
-            item["bookmarked"] = status
-            if status and research_id not in st.session_state.bookmarks:
-                st.session_state.bookmarks.append(research_id)
-            elif not status and research_id in st.session_state.bookmarks:
-                st.session_state.bookmarks.remove(research_id)
-            break
-
-def filter_history(search_term="", selected_tags=None, bookmarked_only=False):
-    """Filter history based on criteria"""
-    filtered = st.session_state.history
-    
-    if bookmarked_only:
-        filtered = [item for item in filtered if item.get("bookmarked", False)]
-    
-    if search_term:
-        search_lower = search_term.lower()
-        filtered = [item for item in filtered if 
-                   search_lower in item["query"].lower() or 
-                   search_lower in item["answer"].lower()]
-    
-    if selected_tags and len(selected_tags) > 0:
-        filtered = [item for item in filtered if 
-                   any(tag in item.get("tags", []) for tag in selected_tags)]
-    
-    return filtered
+    history_store.set_bookmarked(research_id, status)
+    refresh_recent_history()
+
+def filter_history(search_term="", selected_tags=None, bookmarked_only=False, offset=0, limit=HISTORY_PAGE_SIZE):
+    """Filter history using the store's full-text index, returning a page of summaries and the total match count"""
+    return history_store.search(
+        search_term=search_term,
+        selected_tags=selected_tags,
+        bookmarked_only=bookmarked_only,
+        offset=offset,
+        limit=limit
+    )
+
+def toggle_bookmark(research_id):
+    """Persist the state of an entry's bookmark toggle on My Research"""
+    bookmark_research(research_id, st.session_state[f"bookmark_{research_id}"])
+
+@st.fragment
+def render_history_item(summary, expanded=False):
+    """
+    Render one My Research entry as an isolated fragment.
+    
+    Only the summary is shown until the entry is opened; the answer and research
+    bodies are fetched from the store on demand. Interacting with the entry
+    reruns this fragment alone rather than the whole page.
+    """
+    research_id = summary["id"]
+    with st.expander(f"{summary['query']} ({summary['timestamp']})", expanded=expanded):
+        col1, col2 = st.columns([5, 1])
+        
+        with col1:
+            # Display tags
+            st.write("Tags:")
+            for tag in summary.get("tags", []):
+                st.markdown(f"""
+                <span class="tag" style="background-color: #e5e7eb; color: #4b5563;">
+                    #{tag}
+                </span>
+                """, unsafe_allow_html=True)
+        
+        with col2:
+            st.toggle(
+                "🔖 Bookmarked",
+                value=summary.get("bookmarked", False),
+                key=f"bookmark_{research_id}",
+                on_change=toggle_bookmark,
+                args=(research_id,)
+            )
+        
+        if not expanded and research_id not in st.session_state.opened_ids:
+            st.markdown(f'<div class="timestamp">{summary.get("preview", "")}...</div>', unsafe_allow_html=True)
+            st.button(
+                "📖 Load full research",
+                key=f"open_{research_id}",
+                on_click=lambda: st.session_state.opened_ids.add(research_id)
+            )
+            return
+        
+        item = summary if "answer" in summary else history_store.get(research_id)
+        if item is None:
+            st.warning("This research is no longer available.")
+            return
+        
+        # Content tabs
+        tab1, tab2 = st.tabs(["✍️ Answer", "📚 Research Details"])
+        
+        with tab1:
+            st.markdown(f"""
+            <div class="card answer-card">
+                {item['answer']}
+            </div>
+            """, unsafe_allow_html=True)
+        
+        with tab2:
+            st.markdown(f"""
+            <div class="card research-card">
+                {item['research']}
+            </div>
+            """, unsafe_allow_html=True)
 
 def get_research_metrics():
-    """Calculate research metrics for dashboard"""
-    total_research = len(st.session_state.history)
-    
-    if total_research == 0:
-        return {
-            "total_research": 0,
-            "avg_sources": 0,
-            "avg_word_count": 0,
-            "research_by_date": pd.DataFrame(columns=["date", "count"]),
-            "popular_tags": []
-        }
+    """Dashboard metrics, rebuilt only when the history has changed since the last render"""
+    metrics = st.session_state.get("research_metrics")
+    if metrics is None or metrics["version"] != history_store.metrics_version():
+        metrics = history_store.metrics()
+        metrics["research_by_date"] = pd.DataFrame(metrics["research_by_date"], columns=["date", "count"])
+        st.session_state.research_metrics = metrics
+    return metrics
+
+def export_history_file(fmt, **filters):
+    """
+    Write the (filtered) history to a temporary file and return its bytes for download.
+
+    The file stays on disk while it is written, but Streamlit holds the whole
+    payload in memory to serve the download; very large histories are better
+    exported with ``python -m storage.export``.
+    """
+    with tempfile.TemporaryFile() as export_file:
+        export_history(export_file, fmt, store=history_store, **filters)
+        export_file.seek(0)
+        return export_file.read()
+
+def research_job_label(job):
+    """Status line shown above a research job's progress"""
+    if job.status == JobStatus.QUEUED:
+        return "⏳ Waiting for a free research slot..."
+    if job.status == JobStatus.RUNNING:
+        return "✍️ Drafting answer..." if job.stage in (DRAFTING_STARTED, FIRST_TOKEN) else "🔎 Research in progress..."
+    return {
+        JobStatus.SUCCEEDED: "✅ Research complete!",
+        JobStatus.FAILED: "❌ Research failed",
+        JobStatus.CANCELLED: "🚫 Research cancelled",
+    }[job.status]
+
+def render_job(job):
+    """Show a research job's progress and answer so far, and its history metadata once saved"""
+    state = {
+        JobStatus.SUCCEEDED: "complete",
+        JobStatus.FAILED: "error",
+        JobStatus.CANCELLED: "error",
+    }.get(job.status, "running")
+    status = st.status(research_job_label(job), state=state, expanded=not job.done)
+    with status:
+        st.progress(100 if job.status == JobStatus.SUCCEEDED else STAGE_PROGRESS.get(job.stage, 0))
+        for event in job.events:
+            st.write(f'<div class="process-card">{event.message}</div>', unsafe_allow_html=True)
     
-    # Calculate averages
-    avg_sources = sum(item.get("sources_count", 0) for item in st.session_state.history) / total_research
-    avg_word_count = sum(item.get("word_count", 0) for item in st.session_state.history) / total_research
-    
-    # Research by date
-    dates = [item.get("date_obj", datetime.now()).date() for item in st.session_state.history]
-    date_counts = {}
-    for date in dates:
-        date_str = date.strftime("%Y-%m-%d")
-        if date_str in date_counts:
-            date_counts[date_str] += 1
-        else:
-            date_counts[date_str] = 1
-    
-    research_by_date = pd.DataFrame([
-        {"date": k, "count": v} for k, v in date_counts.items()
-    ])
-    
-    # Count tag occurrences
-    tag_counts = {}
-    for item in st.session_state.history:
-        for tag in item.get("tags", []):
-            if tag in tag_counts:
-                tag_counts[tag] += 1
-            else:
-                tag_counts[tag] = 1
+    if job.status == JobStatus.FAILED:
+        # Provider calls have already been retried; a circuit breaker may also be failing fast here
+        st.error(f"Research failed: {job.error.rstrip('.')}. Please try again in a moment.")
+        return
+    if job.status == JobStatus.CANCELLED:
+        return
     
-    # Sort tags by count
-    popular_tags = sorted(tag_counts.items(), key=lambda x: x[1], reverse=True)[:5]
+    st.markdown('<div class="sub-header">📊 Research Results</div>', unsafe_allow_html=True)
+    item = history_store.get(job.research_id) if job.research_id else None
     
-    return {
-        "total_research": total_research,
-        "avg_sources": avg_sources,
-        "avg_word_count": avg_word_count,
-        "research_by_date": research_by_date,
-        "popular_tags": popular_tags
-    }
+    # Display query and metadata
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        st.markdown(f'<div class="query-text">{job.query}</div>', unsafe_allow_html=True)
+        if item is not None:
+            st.markdown(f'<div class="timestamp">Researched on {item["timestamp"]}</div>', unsafe_allow_html=True)
+            
+            # Display tags
+            st.write("Tags:")
+            for tag in item["tags"]:
+                st.markdown(f"""
+                <span class="tag" style="background-color: #e5e7eb; color: #4b5563;">
+                    #{tag}
+                </span>
+                """, unsafe_allow_html=True)
+    
+    with col2:
+        # Bookmark button
+        if item is not None and st.button("🔖 Bookmark this research", key=f"bookmark_job_{job.id}", use_container_width=True):
+            bookmark_research(item["id"], True)
+            st.success("Research bookmarked!")
+    
+    # Tabs for content; the answer shows a cursor while it is still streaming in
+    tab1, tab2 = st.tabs(["✍️ Answer", "📚 Research Details"])
+    with tab1:
+        st.markdown(f"""
+        <div class="card answer-card">
+            {job.answer}{"" if job.done else "▌"}
+        </div>
+        """, unsafe_allow_html=True)
+    with tab2:
+        if job.research_output is not None:
+            st.markdown(f"""
+            <div class="card research-card">
+                {job.research_output.to_text()}
+            </div>
+            """, unsafe_allow_html=True)
+
+def render_jobs(polling):
+    """Research queue of this session and the selected job; reruns itself every JOB_POLL_INTERVAL while polling"""
+    jobs = load_jobs().list(owner=st.session_state.session_key)
+    if polling and all(job.done for job in jobs):
+        # The last running job finished: rerun the page to stop polling and show it in recent history
+        refresh_recent_history()
+        st.rerun()
+    
+    active = next((job for job in jobs if job.id == st.session_state.active_job_id), jobs[0])
+    if len(jobs) > 1:
+        st.markdown('<div class="sub-header">🗂 Research Queue</div>', unsafe_allow_html=True)
+        for job in jobs:
+            col1, col2, col3 = st.columns([6, 1, 1])
+            with col1:
+                st.markdown(f"{JOB_STATUS_ICONS[job.status]} **{job.query}** · {job.status} · {job.elapsed:.0f}s")
+            with col2:
+                st.button(
+                    "Show",
+                    key=f"show_job_{job.id}",
+                    disabled=job.id == active.id,
+                    on_click=lambda job_id=job.id: st.session_state.update(active_job_id=job_id)
+                )
+            with col3:
+                if not job.done:
+                    st.button("Cancel", key=f"cancel_job_{job.id}", on_click=lambda job_id=job.id: load_jobs().cancel(job_id))
+    
+    if active.done:
+        with get_tracer().span("render"):
+            render_job(active)
+    else:
+        render_job(active)
 
-def export_history_to_json():
-    """Convert history to JSON for export"""
-    export_data = []
-    for item in st.session_state.history:
-        export_item = {k: v for k, v in item.items() if k != 'date_obj'}
-        export_data.append(export_item)
-    return json.dumps(export_data, indent=2)
+def render_jobs_panel():
+    """Show this session's research jobs, refreshing while any is still queued or running"""
+    polling = any(not job.done for job in load_jobs().list(owner=st.session_state.session_key))
+    st.fragment(render_jobs, run_every=JOB_POLL_INTERVAL if polling else None)(polling)
 
 # Sidebar
 with st.sidebar:
     st.markdown('<div class="sidebar-header">🧰 Research Console</div>', unsafe_allow_html=True)
     
     # Navigation
+    # Bound to session state so buttons elsewhere can switch pages from their callbacks
     nav_option = st.radio(
         "Navigation",
         ["🔍 Research", "📊 Dashboard", "🗂 My Research", "⚙️ Settings"],
-        label_visibility="collapsed"
+        label_visibility="collapsed",
+        key="nav_option"
     )
     
     st.divider()
@@ -372,7 +547,7 @@ with st.sidebar:
             min_value=1, 
             max_value=5, 
             value=st.session_state.settings["research_depth"],
-            help="Higher values mean more thorough research but slower response"
+            help="Number of search queries run in parallel for each question; 4 and above also use advanced search"
         )
         st.session_state.settings["research_depth"] = research_depth
         
@@ -394,33 +569,68 @@ with st.sidebar:
     elif nav_option == "🗂 My Research":
         # Search and filter
         st.markdown("### Search & Filter")
-        search_term = st.text_input("Search research", value=st.session_state.search_query)
+        search_term = st.text_input(
+            "Search research",
+            value=st.session_state.search_query,
+            help='Matches whole words in queries and answers, ranked by relevance. Use "quotes" for exact phrases.'
+        )
         st.session_state.search_query = search_term
         
         selected_tags = st.multiselect(
             "Filter by tags",
-            options=st.session_state.tags,
-            default=None
+            options=history_store.tags(),
+            default=None,
+            key="selected_tags"
         )
         
-        bookmarked_only = st.toggle("Bookmarked only", value=False)
+        bookmarked_only = st.toggle("Bookmarked only", value=False, key="bookmarked_only")
         
         # Export options
         st.markdown("### Export Options")
-        if st.session_state.history:
+        if history_store.count():
+            export_format = st.selectbox("Format", available_formats(), format_func=FORMATS.get, key="export_format")
+            export_dates = st.date_input("Date range", value=(), key="export_dates", help="Leave empty to export every date")
+            matching_only = st.checkbox("Only research matching the tag and bookmark filters", key="export_matching")
+            since, until = date_range(*export_dates) if export_dates else (None, None)
+            # The file is written only when the button is clicked
             st.download_button(
-                label="📥 Export All Research",
-                data=export_history_to_json(),
-                file_name=f"research_history_{datetime.now().strftime('%Y%m%d')}.json",
-                mime="application/json",
+                label="📥 Export Research",
+                data=partial(
+                    export_history_file, export_format,
+                    tags=selected_tags if matching_only else None,
+                    bookmarked_only=bookmarked_only and matching_only,
+                    since=since, until=until,
+                ),
+                file_name=f"research_history_{datetime.now().strftime('%Y%m%d')}.{export_format}",
+                mime="application/octet-stream",
                 use_container_width=True
             )
+
+        uploaded_history = st.file_uploader(
+            "Import research history",
+            type=["gz", "zst", "jsonl", "ndjson", "parquet", "json"],
+            help="A history export, batch results or an older JSON export. Research already saved is skipped.",
+            key="history_import"
+        )
+        if uploaded_history is not None and st.button("📤 Import Research", use_container_width=True):
+            try:
+                result = import_history(uploaded_history, store=history_store)
+            except Exception as exc:
+                st.error(f"Could not import {uploaded_history.name}: {exc}")
+            else:
+                semantic_index.sync(history_store)
+                refresh_recent_history()
+                st.success(
+                    f"Imported {result.imported} research entries "
+                    f"({result.duplicates} already saved, {result.invalid} incomplete or unreadable)"
+                )
         
         # Clear history
         if st.button("🧹 Clear All History", type="secondary", use_container_width=True):
-            st.session_state.history = []
-            st.session_state.bookmarks = []
-            st.session_state.tags = []
+            history_store.clear()
+            semantic_index.clear()
+            st.session_state.opened_ids = set()
+            refresh_recent_history()
             st.rerun()
     
     elif nav_option == "⚙️ Settings":
@@ -449,6 +659,45 @@ with st.sidebar:
                 ["Default (Gemini)", "GPT-4", "Claude"],
                 index=0
             )
+            cache_drafts = st.toggle(
+                "Reuse cached answers",
+                value=st.session_state.settings["cache_drafts"],
+                help="Also reuse answers drafted by models that sample at a temperature above zero"
+            )
+            st.session_state.settings["cache_drafts"] = cache_drafts
+            similarity_threshold = st.slider(
+                "Similar question threshold",
+                min_value=0.5,
+                max_value=1.0,
+                value=float(st.session_state.settings["similarity_threshold"]),
+                step=0.05,
+                help="Offer a previous answer instead of new research when a past question is at least this similar"
+            )
+            st.session_state.settings["similarity_threshold"] = similarity_threshold
+            token_budget = st.number_input(
+                "Source token budget",
+                min_value=500,
+                max_value=32000,
+                value=st.session_state.settings["token_budget"],
+                step=500,
+                help="Approximate tokens of source material sent to the model when drafting an answer"
+            )
+            st.session_state.settings["token_budget"] = token_budget
+            draft_mode = st.radio(
+                "Drafting strategy",
+                DRAFT_MODES,
+                index=DRAFT_MODES.index(st.session_state.settings["draft_mode"]),
+                format_func=lambda mode: {"single": "Single pass", "map_reduce": "Map-reduce"}[mode],
+                help="Map-reduce summarizes groups of sources in parallel before merging them; faster for deep research"
+            )
+            st.session_state.settings["draft_mode"] = draft_mode
+            history_page_size = st.selectbox(
+                "Research items per page",
+                [10, 20, 50, 100],
+                index=[10, 20, 50, 100].index(st.session_state.settings["history_page_size"]),
+                help="Number of entries shown at a time on My Research"
+            )
+            st.session_state.settings["history_page_size"] = history_page_size
         
         # Reset settings
         if st.button("Reset to Defaults", type="secondary", use_container_width=True):
@@ -456,7 +705,12 @@ with st.sidebar:
                 "research_depth": 3,
                 "include_citations": True,
                 "theme": "light",
-                "max_sources": 5
+                "max_sources": 5,
+                "cache_drafts": False,
+                "similarity_threshold": SIMILARITY_THRESHOLD,
+                "token_budget": DRAFT_TOKEN_BUDGET,
+                "draft_mode": "single",
+                "history_page_size": HISTORY_PAGE_SIZE
             }
             st.rerun()
 
@@ -483,7 +737,6 @@ if nav_option == "🔍 Research":
         search_pressed = st.button(
             "🚀 Start Research", 
             type="primary", 
-            disabled=st.session_state.is_researching,
             use_container_width=True
         )
 
@@ -497,108 +750,61 @@ if nav_option == "🔍 Research":
             st.session_state.query_value = "What are the environmental impacts of electric vehicles compared to conventional cars?"
             st.rerun()  # Rerun to reflect the new value in the text input
     
-    # Research process
-    if search_pressed and query:
-        st.session_state.is_researching = True
-        st.session_state.current_step = "research"
-        
-        # Research progress
-        progress_container = st.container()
-        
-        with progress_container:
-            with st.status("🔎 Research in progress...", expanded=True) as status:
-                st.write('<div class="process-card"Searching the web for relevant information...</div>', unsafe_allow_html=True)
-                
-                # Simulate web research with progress
-                progress_bar = st.progress(0)
-                for i in range(5):
-                    # Simulating different search sources
-                    sources = ["Academic journals", "News articles", "Research papers", 
-                               "Expert opinions", "Statistical data"]
-                    st.write(f'<div class="process-card">Analyzing {sources[i]}...</div>', unsafe_allow_html=True)
-                    progress_bar.progress((i + 1) * 20)
-                    time.sleep(0.5)  # Simulate processing time
-                
-                # Actual research execution
-                research_result = web_research_tool.run(
-                    query, 
-                    depth=st.session_state.settings["research_depth"],
-                    max_sources=st.session_state.settings["max_sources"]
-                )
-                st.write('<div class="process-card">✅ Web research completed</div>', unsafe_allow_html=True)
-                
-                st.session_state.current_step = "drafting"
-                st.write('<div class="process-card">Analyzing and synthesizing information...</div>', unsafe_allow_html=True)
-                time.sleep(1)  # Simulate processing time
-                
-                st.write('<div class="process-card">Drafting comprehensive answer...</div>', unsafe_allow_html=True)
-                llm = get_drafting_llm()
-                final_answer = draft_answer(
-                    llm, 
-                    research_result,
-                    include_citations=st.session_state.settings["include_citations"]
-                )
-                st.write('<div class="process-card">✅ Answer generation completed</div>', unsafe_allow_html=True)
-                
-                status.update(label="✅ Research complete!", state="complete")
-        
-        # Save to history with metadata
-        research_id = save_research_to_history(query, research_result, final_answer)
-        
-        st.session_state.is_researching = False
-        st.session_state.current_step = None
-        
-        # Show latest result
-        st.markdown('<div class="sub-header">📊 Research Results</div>', unsafe_allow_html=True)
+    # Offer a previous answer when the question was already researched in other words
+    force_research = st.session_state.pop("force_research", False)
+    previous_item, similarity = (None, 0.0)
+    if search_pressed and query and not force_research:
+        previous_item, similarity = find_previous_research(query)
+    
+    if previous_item is not None:
+        st.info(f'This looks like research you already did ({similarity:.0%} similar): "{previous_item["query"]}"')
+        st.markdown(f"""
+        <div class="card answer-card">
+            {previous_item["answer"]}
+        </div>
+        """, unsafe_allow_html=True)
         
-        # Display query and metadata
-        col1, col2 = st.columns([3, 1])
+        col1, col2 = st.columns(2)
         with col1:
-            st.markdown(f'<div class="query-text">{query}</div>', unsafe_allow_html=True)
-            timestamp = st.session_state.history[-1]["timestamp"]
-            st.markdown(f'<div class="timestamp">Researched on {timestamp}</div>', unsafe_allow_html=True)
-            
-            # Display tags
-            st.write("Tags:")
-            for tag in st.session_state.history[-1]["tags"]:
-                st.markdown(f"""
-                <span class="tag" style="background-color: #e5e7eb; color: #4b5563;">
-                    #{tag}
-                </span>
-                """, unsafe_allow_html=True)
-        
+            # A callback, since this branch is not rendered again on the rerun the click causes
+            st.button(
+                "📖 Use previous answer",
+                type="primary",
+                use_container_width=True,
+                on_click=lambda research_id=previous_item["id"]: st.session_state.update(
+                    selected_research_id=research_id, nav_option="🗂 My Research"
+                )
+            )
         with col2:
-            # Bookmark button
-            if st.button("🔖 Bookmark this research", use_container_width=True):
-                bookmark_research(research_id, True)
-                st.success("Research bookmarked!")
-        
-        # Tabs for content
-        tab1, tab2 = st.tabs(["✍️ Answer", "📚 Research Details"])
-        
-        with tab1:
-            st.markdown(f"""
-            <div class="card answer-card">
-                {final_answer}
-            </div>
-            """, unsafe_allow_html=True)
-        
-        with tab2:
-            st.markdown(f"""
-            <div class="card research-card">
-                {research_result}
-            </div>
-            """, unsafe_allow_html=True)
+            st.button(
+                "🔄 Research anyway",
+                use_container_width=True,
+                on_click=lambda: st.session_state.update(force_research=True)
+            )
+    
+    # Research runs as a background job, so it keeps going across reruns and page changes
+    elif (search_pressed or force_research) and query:
+        st.session_state.active_job_id = load_jobs().submit(
+            query,
+            owner=st.session_state.session_key,
+            depth=st.session_state.settings["research_depth"],
+            max_sources=st.session_state.settings["max_sources"],
+            include_citations=st.session_state.settings["include_citations"],
+            cache_drafts=st.session_state.settings["cache_drafts"],
+            token_budget=st.session_state.settings["token_budget"],
+            draft_mode=st.session_state.settings["draft_mode"]
+        )
+        render_jobs_panel()
     
-    # Display recent history preview if not researching
-    elif not st.session_state.is_researching and st.session_state.history:
+    elif load_jobs().list(owner=st.session_state.session_key):
+        render_jobs_panel()
+    
+    # Display recent history preview when this session has no research jobs
+    elif st.session_state.recent_history:
         st.markdown('<div class="sub-header">🕒 Recent Research</div>', unsafe_allow_html=True)
         
         # Show last 3 research items in a compact format
-        recent_items = st.session_state.history[-3:] if len(st.session_state.history) >= 3 else st.session_state.history
-        recent_items.reverse()  # Most recent first
-        
-        for item in recent_items:
+        for item in st.session_state.recent_history:
             with st.container():
                 col1, col2 = st.columns([5, 1])
                 with col1:
@@ -610,24 +816,29 @@ if nav_option == "🔍 Research":
                 st.markdown(f'<div class="timestamp">{item["timestamp"]}</div>', unsafe_allow_html=True)
                 st.markdown(f'''
                 <div style="margin-top: 8px; margin-bottom: 12px; overflow: hidden; text-overflow: ellipsis; max-height: 60px;">
-                    {item["answer"][:150]}...
+                    {item["preview"][:150]}...
                 </div>
                 ''', unsafe_allow_html=True)
                 
-                if st.button(f"View full research", key=f"view_{item['id']}"):
-                    # Navigate to My Research with this item selected
-                    st.session_state.selected_research_id = item["id"]
-                    st.session_state.nav_option = "🗂 My Research"
-                    st.rerun()
+                # Navigate to My Research with this item selected
+                st.button(
+                    "View full research",
+                    key=f"view_{item['id']}",
+                    on_click=lambda research_id=item["id"]: st.session_state.update(
+                        selected_research_id=research_id, nav_option="🗂 My Research"
+                    )
+                )
                 
                 st.markdown("<hr style='margin: 15px 0;'>", unsafe_allow_html=True)
         
-        if len(st.session_state.history) > 3:
-            st.markdown(f"And {len(st.session_state.history) - 3} more research items in history...")
-            if st.button("View all research history"):
-                # Navigate to My Research page
-                st.session_state.nav_option = "🗂 My Research"
-                st.rerun()
+        total_research = history_store.count()
+        if total_research > 3:
+            st.markdown(f"And {total_research - 3} more research items in history...")
+            # Navigate to My Research page
+            st.button(
+                "View all research history",
+                on_click=lambda: st.session_state.update(nav_option="🗂 My Research")
+            )
 
 elif nav_option == "📊 Dashboard":
     st.markdown('<div class="main-header">📊 Research Dashboard</div>', unsafe_allow_html=True)
@@ -699,90 +910,153 @@ elif nav_option == "📊 Dashboard":
             else:
                 st.info("Not enough data to display chart")
         
+        # Per-stage latency and cost from recent traces
+        st.subheader("Stage Latency")
+        stages = stage_latencies(read_spans())
+        if stages:
+            stage_df = pd.DataFrame([
+                {"stage": name, "percentile": label, "ms": summary[key]}
+                for name, summary in stages.items()
+                for label, key in (("p50", "p50_ms"), ("p95", "p95_ms"))
+            ])
+            col1, col2 = st.columns([2, 1])
+            with col1:
+                fig = px.bar(
+                    stage_df,
+                    x="stage",
+                    y="ms",
+                    color="percentile",
+                    barmode="group",
+                    title="Latency per Stage (ms)"
+                )
+                fig.update_layout(height=300)
+                st.plotly_chart(fig, use_container_width=True)
+            with col2:
+                st.dataframe(
+                    pd.DataFrame([
+                        {"stage": name, "runs": summary["count"], "p50 ms": round(summary["p50_ms"]),
+                         "p95 ms": round(summary["p95_ms"]), "est. cost $": round(summary["cost"], 4)}
+                        for name, summary in stages.items()
+                    ]),
+                    hide_index=True,
+                    use_container_width=True
+                )
+        else:
+            st.info("No traced research runs yet")
+        
         # Bookmarked research
         st.subheader("Bookmarked Research")
-        bookmarked = [item for item in st.session_state.history if item.get("bookmarked", False)]
+        bookmarked = history_store.list_summaries(limit=3, bookmarked_only=True)
         
         if bookmarked:
-            for item in bookmarked[:3]:  # Show up to 3 bookmarked items
+            for item in bookmarked:  # Show up to 3 bookmarked items
                 st.markdown(f"""
                 <div class="card" style="background-color: #fffbeb; border-left: 5px solid #f59e0b;">
                     <div class="query-text">{item["query"]}</div>
                     <div class="timestamp">{item["timestamp"]}</div>
-                    <div style="margin-top: 10px;">{item["answer"][:100]}...</div>
+                    <div style="margin-top: 10px;">{item["preview"][:100]}...</div>
                 </div>
                 """, unsafe_allow_html=True)
             
-            if len(bookmarked) > 3:
-                st.markdown(f"And {len(bookmarked) - 3} more bookmarked items...")
+            bookmarked_count = history_store.count(bookmarked_only=True)
+            if bookmarked_count > 3:
+                st.markdown(f"And {bookmarked_count - 3} more bookmarked items...")
         else:
             st.info("No bookmarked research yet. Use the bookmark button to save important research.")
+        
+        # Cache performance
+        st.subheader("Cache Performance")
+        col1, col2 = st.columns(2)
+        for col, label, cache in [(col1, "Web search", get_search_cache()), (col2, "Drafted answers", get_draft_cache())]:
+            stats = cache.stats.as_dict()
+            with col:
+                st.markdown(f"""
+                <div style="text-align: center;">
+                    <div class="metric-value">{stats['hit_rate']:.0%}</div>
+                    <div class="metric-label">{label} hit rate ({stats['hits']} hits / {stats['misses']} misses)</div>
+                </div>
+                """, unsafe_allow_html=True)
     else:
         st.info("Start researching to see your dashboard statistics")
 
 elif nav_option == "🗂 My Research":
     st.markdown('<div class="main-header">🗂 My Research History</div>', unsafe_allow_html=True)
     
-    # Apply filters
-    filtered_history = filter_history(
-        search_term=st.session_state.search_query,
-        selected_tags=st.session_state.get("selected_tags", []),
-        bookmarked_only=st.session_state.get("bookmarked_only", False)
+    # Start from the first page whenever the filters change
+    page_size = st.session_state.settings["history_page_size"]
+    filters = (
+        st.session_state.search_query,
+        tuple(st.session_state.get("selected_tags", [])),
+        st.session_state.get("bookmarked_only", False),
+        page_size
     )
+    if st.session_state.get("history_filters") != filters:
+        st.session_state.history_filters = filters
+        st.session_state.history_page = 0
+    
+    # Apply filters, fetching only the summaries of the current page
+    def fetch_page():
+        return filter_history(
+            search_term=st.session_state.search_query,
+            selected_tags=st.session_state.get("selected_tags", []),
+            bookmarked_only=st.session_state.get("bookmarked_only", False),
+            offset=st.session_state.history_page * page_size,
+            limit=page_size
+        )
+    filtered_history, total_matches = fetch_page()
+    page_count = max(1, -(-total_matches // page_size))
+    # Deleting entries can leave the current page past the end; show the last one instead
+    if st.session_state.history_page >= page_count:
+        st.session_state.history_page = page_count - 1
+        filtered_history, total_matches = fetch_page()
+    # The range describes the page's own slice, before a selected entry from elsewhere is added
+    first = st.session_state.history_page * page_size + 1
+    last = first + len(filtered_history) - 1
+    showing = f"Showing {first}-{last} of {total_matches} research items"
+    
+    # Check if a specific research item is selected
+    selected_research_id = st.session_state.get("selected_research_id", None)
+    page_ids = {item["id"] for item in filtered_history}
+    if selected_research_id is not None and selected_research_id not in page_ids:
+        selected_item = history_store.get(selected_research_id)
+        if selected_item:
+            filtered_history.insert(0, selected_item)
+            showing = f"{showing}, plus the selected research" if total_matches else "Showing the selected research"
     
     if not filtered_history:
         st.info("No research history found. Start researching to build your knowledge base.")
     else:
         # Display filtered research
-        st.markdown(f"Showing {len(filtered_history)} research items")
-        
-        # Check if a specific research item is selected
-        selected_research_id = st.session_state.get("selected_research_id", None)
+        st.markdown(showing)
         
-        for i, item in enumerate(filtered_history):
+        for i, summary in enumerate(filtered_history):
             # Expand the item if it matches selected_research_id or if it's the first item
-            is_expanded = (item["id"] == selected_research_id) or (i == 0 and selected_research_id is None)
-            with st.expander(f"{item['query']} ({item['timestamp']})", expanded=is_expanded):
-                col1, col2 = st.columns([5, 1])
-                
-                with col1:
-                    # Display tags
-                    st.write("Tags:")
-                    for tag in item.get("tags", []):
-                        st.markdown(f"""
-                        <span class="tag" style="background-color: #e5e7eb; color: #4b5563;">
-                            #{tag}
-                        </span>
-                        """, unsafe_allow_html=True)
-                
-                with col2:
-                    # Bookmark toggle
-                    is_bookmarked = item.get("bookmarked", False)
-                    if is_bookmarked:
-                        if st.button("🔖 Unbookmark", key=f"unbookmark_{item['id']}"):
-                            bookmark_research(item["id"], False)
-                            st.rerun()
-                    else:
-                        if st.button("🔖 Bookmark", key=f"bookmark_{item['id']}"):
-                            bookmark_research(item["id"], True)
-                            st.rerun()
-                
-                # Content tabs
-                tab1, tab2 = st.tabs(["✍️ Answer", "📚 Research Details"])
-                
-                with tab1:
-                    st.markdown(f"""
-                    <div class="card answer-card">
-                        {item['answer']}
-                    </div>
-                    """, unsafe_allow_html=True)
-                
-                with tab2:
-                    st.markdown(f"""
-                    <div class="card research-card">
-                        {item['research']}
-                    </div>
-                    """, unsafe_allow_html=True)
+            is_expanded = (summary["id"] == selected_research_id) or (
+                i == 0 and selected_research_id is None and st.session_state.history_page == 0
+            )
+            render_history_item(summary, expanded=is_expanded)
+        
+        if page_count > 1:
+            col1, col2, col3 = st.columns([1, 2, 1])
+            with col1:
+                st.button(
+                    "← Previous",
+                    disabled=st.session_state.history_page == 0,
+                    use_container_width=True,
+                    on_click=lambda: st.session_state.update(history_page=st.session_state.history_page - 1)
+                )
+            with col2:
+                st.markdown(
+                    f'<div style="text-align: center;">Page {st.session_state.history_page + 1} of {page_count}</div>',
+                    unsafe_allow_html=True
+                )
+            with col3:
+                st.button(
+                    "Next →",
+                    disabled=st.session_state.history_page >= page_count - 1,
+                    use_container_width=True,
+                    on_click=lambda: st.session_state.update(history_page=st.session_state.history_page + 1)
+                )
         
         # Clear selected_research_id after displaying to prevent persistent expansion
         if selected_research_id is not None:
@@ -0,0 +1,102 @@
+"""
+Dashboard metrics render time at growing history sizes.
+
+Compares the counter tables read by ``SQLiteHistoryStore.metrics`` with the
+full aggregation over every entry it replaced, then times the whole dashboard
+page through Streamlit's AppTest.
+
+Usage:
+    python -m benchmarks.bench_metrics --sizes 10000 100000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from storage.embeddings import SemanticIndex, set_semantic_index
+from storage.history_store import SQLiteHistoryStore, set_history_store
+
+TOPICS = ["ai", "healthcare", "energy", "climate", "finance", "education", "robotics", "india", "policy", "markets"]
+
+FULL_SCAN_QUERIES = [
+    "SELECT COUNT(*), AVG(sources_count), AVG(word_count) FROM history",
+    "SELECT date(created_at, 'unixepoch', 'localtime') AS day, COUNT(*) FROM history GROUP BY day ORDER BY day",
+    "SELECT tag, COUNT(*) AS uses FROM entry_tags GROUP BY tag ORDER BY uses DESC, tag LIMIT 5",
+]
+
+
+def populate(store, size, seed=0):
+    """Insert ``size`` synthetic entries spread over the last year."""
+    rng = random.Random(seed)
+    start = datetime.now() - timedelta(days=365)
+    for i in range(size):
+        date_obj = start + timedelta(seconds=i * 365 * 24 * 3600 / size)
+        tags = rng.sample(TOPICS, 3)
+        answer = " ".join(rng.choices(TOPICS, k=rng.randint(50, 400)))
+        store.add({
+            "id": str(i),
+            "query": f"What is new in {' and '.join(tags)}?",
+            "research": "",
+            "answer": answer,
+            "timestamp": date_obj.strftime("%Y-%m-%d %H:%M:%S"),
+            "date_obj": date_obj,
+            "tags": tags,
+            "word_count": len(answer.split()),
+            "sources_count": rng.randint(1, 10),
+        })
+
+
+def best_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def full_scan(store):
+    with store._lock:
+        for sql in FULL_SCAN_QUERIES:
+            store._conn.execute(sql).fetchall()
+
+
+def render_dashboard(store, directory):
+    """Time one rerun of the dashboard page, after a first run that warms imports and caches."""
+    from streamlit.testing.v1 import AppTest
+
+    set_history_store(store)
+    index = SemanticIndex(directory=os.path.join(directory, "vectors"))
+    index.sync(store)
+    set_semantic_index(index)
+    app = AppTest.from_file(os.path.join(os.path.dirname(__file__), "..", "app.py"), default_timeout=120)
+    app.run()
+    app.sidebar.radio[0].set_value("📊 Dashboard").run()
+    start = time.perf_counter()
+    app.run()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--skip-app", action="store_true", help="Skip timing the full dashboard page")
+    args = parser.parse_args()
+
+    print(f"{'entries':>8} {'counters':>12} {'full scan':>12} {'page rerun':>12}")
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            store = SQLiteHistoryStore(os.path.join(directory, "history.sqlite"))
+            populate(store, size)
+
+            counters = best_of(store.metrics, args.repeat)
+            scan = best_of(lambda: full_scan(store), max(1, args.repeat // 4))
+            page = "-" if args.skip_app else f"{render_dashboard(store, directory) * 1000:.0f} ms"
+            print(f"{size:>8} {counters * 1000:>9.2f} ms {scan * 1000:>9.1f} ms {page:>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+"""
+Offline end-to-end benchmarks replaying recorded provider responses.
+
+Times web research, drafting and the full research graph against the fixture's
+Tavily results and Gemini completions (with synthetic latency), and the history
+search and dashboard metrics queries at growing history sizes. Each scenario
+reports throughput, latency percentiles and peak Python memory. Results can be
+saved as JSON and compared with a saved baseline to catch regressions.
+
+Usage:
+    python -m benchmarks.bench_pipeline --save .bench/baseline.json
+    python -m benchmarks.bench_pipeline --compare .bench/baseline.json
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pandas as pd
+
+from agents.cache import LRUCache
+from agents.drafting_agent import draft_answer
+from agents.research_agent import run_web_research
+from agents.sources import ResearchResult, Source
+from agents.tracing import Tracer, set_tracer
+from benchmarks.bench_metrics import populate
+from benchmarks.replay import FIXTURE_PATH, ReplayChatModel, ReplaySearchBackend, load_fixtures
+from graph.workflow import create_workflow, run_research
+from storage.history_store import SQLiteHistoryStore
+
+# Latency percentiles or throughput worse than the baseline by more than this fraction count as regressions
+DEFAULT_TOLERANCE = 0.20
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def measure(fn, inputs, workers=1, repeat=1):
+    """
+    Time ``fn`` over every input, ``repeat`` times, on ``workers`` threads.
+
+    Peak memory is taken from a separate single pass under tracemalloc, so its
+    overhead does not skew the timings.
+
+    Returns:
+        A dict with calls, throughput, latency percentiles (ms) and peak memory (KiB)
+    """
+    fn(inputs[0])
+
+    def timed(item):
+        start = time.perf_counter()
+        fn(item)
+        return time.perf_counter() - start
+
+    work = list(inputs) * repeat
+    start = time.perf_counter()
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            latencies = list(pool.map(timed, work))
+    else:
+        latencies = [timed(item) for item in work]
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    for item in inputs:
+        fn(item)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {
+        "calls": len(work),
+        "throughput_per_s": len(work) / elapsed,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "peak_kib": peak / 1024,
+    }
+
+
+def research_scenarios(fixtures, args):
+    """Benchmarks of web research, drafting and the whole graph over the fixture's questions."""
+    search = ReplaySearchBackend(fixtures, latency=args.search_latency, jitter=args.jitter)
+    llm = ReplayChatModel.from_fixtures(
+        fixtures, latency=args.llm_latency, token_delay=args.token_delay, temperature=0.5
+    )
+    queries = fixtures["queries"]
+
+    def cache():
+        # A zero-sized cache keeps nothing, so every run reaches the replayed providers
+        return LRUCache() if args.warm else LRUCache(max_entries=0)
+
+    search_cache, draft_cache = cache(), cache()
+    workflow = create_workflow(llm=llm, search_backend=search, search_cache=search_cache, draft_cache=draft_cache)
+    research = {
+        query: ResearchResult(query, [Source.from_result(result) for result in search(query, args.max_sources)])
+        for query in queries
+    }
+
+    yield "web_research", lambda query: run_web_research(
+        query, depth=args.depth, max_sources=args.max_sources, backend=search, cache=search_cache, fan_out=True
+    ), queries, args.workers
+    yield "draft_answer", lambda query: draft_answer(
+        llm, research[query], cache=draft_cache, cache_nondeterministic=True
+    ), queries, args.workers
+    for mode in ("single", "map_reduce"):
+        yield f"pipeline[{mode}]", lambda query, mode=mode: run_research(
+            query, depth=args.depth, max_sources=args.max_sources, cache_drafts=True,
+            workflow=workflow, draft_mode=mode
+        ), queries, args.workers
+
+
+def history_scenarios(size, directory):
+    """Benchmarks of the My Research filters and dashboard metrics over ``size`` stored entries."""
+    store = SQLiteHistoryStore(os.path.join(directory, f"history-{size}.sqlite"))
+    populate(store, size)
+    for entry_id in range(0, size, 7):
+        store.set_bookmarked(str(entry_id), True)
+
+    # The filter combinations My Research offers, as filter_history passes them to the store
+    filters = [
+        {},
+        {"search_term": "energy"},
+        {"selected_tags": ["ai", "climate"]},
+        {"bookmarked_only": True},
+        {"search_term": "finance", "selected_tags": ["policy"]},
+        {"offset": size // 2},
+    ]
+    # History queries take milliseconds, so each pass runs every input several times
+    yield f"filter_history@{size}", lambda kwargs: store.search(**{"limit": 20, **kwargs}), filters * 5, 1
+
+    def research_metrics(_):
+        # get_research_metrics after the history changed: read the counters and build the chart frame
+        store.metrics_version()
+        metrics = store.metrics()
+        metrics["research_by_date"] = pd.DataFrame(metrics["research_by_date"], columns=["date", "count"])
+        return metrics
+
+    yield f"get_research_metrics@{size}", research_metrics, list(range(30)), 1
+
+
+def environment():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "recorded_at": datetime.now().isoformat(timespec="seconds"),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """
+    Print each scenario's change against a baseline.
+
+    Returns:
+        The names of scenarios that regressed by more than ``tolerance``
+    """
+    regressions = []
+    print(f"\n{'scenario':<28} {'p50':>9} {'p95':>9} {'throughput':>11}")
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            print(f"{name:<28} {'(new)':>9}")
+            continue
+        changes = {key: result[key] / before[key] - 1 for key in ("p50_ms", "p95_ms", "throughput_per_s") if before[key]}
+        regressed = (
+            changes.get("p50_ms", 0) > tolerance or changes.get("p95_ms", 0) > tolerance
+            or changes.get("throughput_per_s", 0) < -tolerance
+        )
+        if regressed:
+            regressions.append(name)
+        print(
+            f"{name:<28} {changes.get('p50_ms', 0):>+8.0%} {changes.get('p95_ms', 0):>+8.0%} "
+            f"{changes.get('throughput_per_s', 0):>+10.0%}" + ("  REGRESSION" if regressed else "")
+        )
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--fixtures", default=FIXTURE_PATH, help="Recorded provider responses to replay")
+    parser.add_argument("--search-latency", type=float, default=0.3, help="Mean seconds per replayed search")
+    parser.add_argument("--llm-latency", type=float, default=0.8, help="Seconds before a replayed completion starts")
+    parser.add_argument("--token-delay", type=float, default=0.005, help="Seconds between streamed words")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Fraction by which search latency varies")
+    parser.add_argument("--depth", type=int, default=3, help="Research depth (1-5)")
+    parser.add_argument("--max-sources", type=int, default=5, help="Maximum sources per query")
+    parser.add_argument("--workers", type=int, default=4, help="Research runs in flight at once")
+    parser.add_argument("--repeat", type=int, default=3, help="Passes over the inputs of each scenario")
+    parser.add_argument("--warm", action="store_true", help="Keep search and draft caches between runs")
+    parser.add_argument("--history-sizes", type=int, nargs="*", default=[1_000, 10_000])
+    parser.add_argument("--only", nargs="+", help="Run only scenarios whose name starts with one of these")
+    parser.add_argument("--save", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Baseline JSON file to compare the results with")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    # Keep benchmark runs out of the trace file the dashboard reads
+    set_tracer(Tracer())
+    fixtures = load_fixtures(args.fixtures)
+
+    results = {}
+    print(f"{'scenario':<28} {'calls':>6} {'req/s':>8} {'p50':>10} {'p95':>10} {'p99':>10} {'peak mem':>10}")
+    with tempfile.TemporaryDirectory() as directory:
+        scenarios = [research_scenarios(fixtures, args)]
+        scenarios += [history_scenarios(size, directory) for size in args.history_sizes]
+        for group in scenarios:
+            for name, fn, inputs, workers in group:
+                if args.only and not name.startswith(tuple(args.only)):
+                    continue
+                result = results[name] = measure(fn, inputs, workers=workers, repeat=args.repeat)
+                print(
+                    f"{name:<28} {result['calls']:>6} {result['throughput_per_s']:>8.1f} "
+                    f"{result['p50_ms']:>7.1f} ms {result['p95_ms']:>7.1f} ms {result['p99_ms']:>7.1f} ms "
+                    f"{result['peak_kib']:>6.0f} KiB"
+                )
+
+    if args.save:
+        directory = os.path.dirname(args.save)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({"environment": environment(), "settings": vars(args), "results": results}, f, indent=2)
+        print(f"\nSaved results to {args.save}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} scenario(s) regressed by more than {args.tolerance:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+Recorded provider responses for offline benchmarks.
+
+A fixture file holds Tavily search results keyed by query and Gemini completions
+keyed by a hash of their prompt. ``ReplaySearchBackend`` and ``ReplayChatModel``
+serve them back with configurable synthetic latency, so the full pipeline runs
+without network access. Prompts or queries missing from the fixture are answered
+with a recorded response chosen deterministically, so a prompt change does not
+break replay.
+
+Record fixtures from the live providers (needs TAVILY_API_KEY and GOOGLE_API_KEY):
+    python -m benchmarks.replay record queries.jsonl -o benchmarks/fixtures/providers.json
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from agents.fakes import FakeStreamingChatModel
+from agents.research_agent import normalize_query
+
+FIXTURE_PATH = os.path.join(os.path.dirname(__file__), "fixtures", "providers.json")
+
+
+def prompt_key(messages):
+    """Hash a chat prompt so its completion can be looked up when replaying."""
+    digest = hashlib.sha256()
+    for message in messages:
+        digest.update(f"{message.type}\0{message.content}\0".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _pick(pool, key):
+    return pool[int(hashlib.sha256(key.encode("utf-8")).hexdigest(), 16) % len(pool)]
+
+
+def load_fixtures(path=FIXTURE_PATH):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_fixtures(fixtures, path=FIXTURE_PATH):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(fixtures, f, indent=1, ensure_ascii=False)
+
+
+class ReplaySearchBackend:
+    """
+    Search backend answering from recorded Tavily results after a synthetic delay.
+
+    Args:
+        fixtures: Loaded fixture dict
+        latency: Mean delay in seconds per search
+        jitter: Delay varies uniformly by up to this fraction of ``latency``
+        seed: Seed for the jitter, so runs are repeatable
+    """
+
+    def __init__(self, fixtures, latency=0.0, jitter=0.0, seed=0):
+        self.searches = {normalize_query(entry["query"]): entry["results"] for entry in fixtures["searches"]}
+        self.pool = list(self.searches.values())
+        self.latency = latency
+        self.jitter = jitter
+        self.calls = 0
+        self.misses = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def __call__(self, query, max_results=5, search_depth="basic"):
+        key = normalize_query(query)
+        with self._lock:
+            self.calls += 1
+            results = self.searches.get(key)
+            if results is None:
+                self.misses += 1
+                results = _pick(self.pool, key)
+            delay = self.latency * (1 + self._rng.uniform(-self.jitter, self.jitter))
+        if delay > 0:
+            time.sleep(delay)
+        return [dict(result) for result in results[:max_results]]
+
+
+class ReplayChatModel(FakeStreamingChatModel):
+    """
+    Chat model answering from recorded completions.
+
+    ``latency`` is the delay before the answer (or its first chunk) and
+    ``token_delay`` the delay between streamed words, as in FakeStreamingChatModel.
+    """
+
+    completions: dict = {}
+    model_name: str = "replay"
+    misses: int = 0
+
+    @classmethod
+    def from_fixtures(cls, fixtures, **kwargs):
+        completions = {entry["prompt"]: entry["response"] for entry in fixtures["completions"]}
+        return cls(completions=completions, **kwargs)
+
+    def _respond(self, messages):
+        key = prompt_key(messages)
+        response = self.completions.get(key)
+        if response is None:
+            self.misses += 1
+            response = _pick(list(self.completions.values()), key)
+        return response
+
+
+class RecordingHandler(BaseCallbackHandler):
+    """Callback handler capturing every chat prompt and its completion while the live pipeline runs."""
+
+    def __init__(self):
+        self.completions = []
+        self._prompts = {}
+        self._lock = threading.Lock()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        with self._lock:
+            self._prompts[run_id] = prompt_key(messages[0])
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        with self._lock:
+            prompt = self._prompts.pop(run_id, None)
+            if prompt is not None:
+                text = "".join(generation.text for generation in response.generations[0])
+                self.completions.append({"prompt": prompt, "response": text})
+
+
+class RecordingSearchBackend:
+    """Search backend wrapper keeping every query and its results."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.searches = []
+        self._lock = threading.Lock()
+
+    def __call__(self, query, max_results=5, search_depth="basic"):
+        results = self.backend(query, max_results=max_results, search_depth=search_depth)
+        with self._lock:
+            self.searches.append({"query": query, "search_depth": search_depth, "results": results})
+        return results
+
+
+def record(queries, output_path=FIXTURE_PATH, depth=3, max_sources=5, draft_mode="single"):
+    """
+    Run queries through the live pipeline and save the provider responses as a fixture.
+
+    Caches are bypassed so every query reaches the providers.
+    """
+    from agents.cache import LRUCache
+    from agents.drafting_agent import get_drafting_llm
+    from agents.research_agent import resilient_search
+    from graph.workflow import create_workflow, run_research
+
+    search = RecordingSearchBackend(resilient_search)
+    handler = RecordingHandler()
+    llm = get_drafting_llm().with_config(callbacks=[handler])
+    for query in queries:
+        workflow = create_workflow(
+            llm=llm, search_backend=search, search_cache=LRUCache(), draft_cache=LRUCache()
+        )
+        run_research(query, depth=depth, max_sources=max_sources, workflow=workflow, draft_mode=draft_mode)
+    fixtures = {"queries": list(queries), "searches": search.searches, "completions": handler.completions}
+    save_fixtures(fixtures, output_path)
+    return fixtures
+
+
+def main(argv=None):
+    from graph.batch import load_queries
+
+    parser = argparse.ArgumentParser(description="Record live provider responses as a benchmark fixture.")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    recorder = subcommands.add_parser("record", help="Run queries against the live providers and save the responses")
+    recorder.add_argument("queries", help="JSONL or CSV file of queries")
+    recorder.add_argument("-o", "--output", default=FIXTURE_PATH, help="Fixture file to write")
+    recorder.add_argument("--depth", type=int, default=3, help="Research depth (1-5)")
+    recorder.add_argument("--max-sources", type=int, default=5, help="Maximum sources per query")
+    recorder.add_argument("--draft-mode", choices=["single", "map_reduce"], default="single")
+    args = parser.parse_args(argv)
+
+    queries = [item["query"] for item in load_queries(args.queries)]
+    fixtures = record(queries, args.output, args.depth, args.max_sources, args.draft_mode)
+    print(f"Recorded {len(fixtures['searches'])} searches and {len(fixtures['completions'])} completions "
+          f"to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+import argparse
+import csv
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dotenv import load_dotenv
+from langchain_core.rate_limiters import InMemoryRateLimiter
+from agents.drafting_agent import get_drafting_llm, DRAFT_MODES
+from agents.research_agent import resilient_search
+from graph.workflow import create_workflow, run_research
+from storage.history import build_history_entry, serialize_entry
+
+
+def load_queries(path):
+    """
+    Read batch queries from a JSONL or CSV file.
+
+    JSONL lines may be plain strings or objects with a ``query`` field; CSV files
+    need a ``query`` column. An optional ``id`` field/column gives each query a
+    stable key for checkpointing, otherwise its line number is used.
+
+    Returns:
+        A list of ``{"input_id", "query"}`` dicts
+    """
+    queries = []
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.lower().endswith(".csv"):
+            rows = list(csv.DictReader(f))
+        else:
+            rows = [json.loads(line) for line in f if line.strip()]
+
+    for line_no, row in enumerate(rows, start=1):
+        if isinstance(row, str):
+            row = {"query": row}
+        query = (row.get("query") or "").strip()
+        if query:
+            queries.append({"input_id": str(row.get("id") or line_no), "query": query})
+    return queries
+
+
+def load_checkpoint(output_path):
+    """Return the input ids already present in an output file, so a rerun can skip them."""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                done.add(json.loads(line)["input_id"])
+            except (ValueError, KeyError):
+                # A crash can leave a truncated last line; that query is simply redone
+                continue
+    return done
+
+
+def rate_limited(backend, rate_limiter):
+    """Wrap a search backend so every upstream call first takes a token from ``rate_limiter``."""
+    def limited_backend(query, max_results=5, search_depth="basic"):
+        rate_limiter.acquire()
+        return backend(query, max_results=max_results, search_depth=search_depth)
+    return limited_backend
+
+
+def run_batch(queries_path, output_path, workers=4, depth=3, max_sources=5, include_citations=True,
+              search_rps=2.0, llm_rps=1.0, llm=None, search_backend=None, on_result=None, draft_mode="single"):
+    """
+    Run every query in a file through the research + drafting pipeline.
+
+    Each finished query is appended to ``output_path`` as a history entry (a
+    JSON line like those of storage.export, so the file can be imported) and flushed immediately, so
+    the output doubles as the checkpoint: rerunning the same command skips
+    queries already written. Failures go to ``<output_path>.errors.jsonl`` and
+    are retried on the next run.
+
+    Args:
+        queries_path: JSONL or CSV file of queries (see load_queries)
+        output_path: JSONL file results are appended to
+        workers: Number of queries processed concurrently
+        depth: Research depth passed to the workflow
+        max_sources: Maximum sources per query
+        include_citations: Whether drafted answers include citations
+        search_rps: Maximum search provider requests per second across all workers
+        llm_rps: Maximum drafting model requests per second across all workers
+        llm: Drafting model; defaults to get_drafting_llm() with the LLM rate limit applied
+        search_backend: Search callable; defaults to Tavily
+        on_result: Optional callback receiving each output or error record
+        draft_mode: "single" or "map_reduce" drafting
+
+    Returns:
+        A summary dict with total, skipped, completed and failed counts
+    """
+    queries = load_queries(queries_path)
+    done = load_checkpoint(output_path)
+    pending = [item for item in queries if item["input_id"] not in done]
+
+    if llm is None:
+        llm = get_drafting_llm(rate_limiter=InMemoryRateLimiter(requests_per_second=llm_rps))
+    search_backend = rate_limited(
+        search_backend or resilient_search, InMemoryRateLimiter(requests_per_second=search_rps)
+    )
+    workflow = create_workflow(llm=llm, search_backend=search_backend)
+
+    summary = {"total": len(queries), "skipped": len(queries) - len(pending), "completed": 0, "failed": 0}
+    write_lock = threading.Lock()
+
+    def process(item):
+        state = run_research(
+            item["query"], depth=depth, max_sources=max_sources,
+            include_citations=include_citations, workflow=workflow, draft_mode=draft_mode,
+        )
+        research = state["research_output"]
+        record = serialize_entry(build_history_entry(item["query"], research, state["final_answer"]))
+        record["sources"] = [source.to_dict() for source in research.sources]
+        record["input_id"] = item["input_id"]
+        return record
+
+    def append(path, record):
+        with write_lock, open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(process, item): item for item in pending}
+        for future in as_completed(futures):
+            item = futures[future]
+            try:
+                record = future.result()
+            except Exception as exc:
+                record = {"input_id": item["input_id"], "query": item["query"], "error": str(exc)}
+                append(output_path + ".errors.jsonl", record)
+                summary["failed"] += 1
+            else:
+                append(output_path, record)
+                summary["completed"] += 1
+            if on_result is not None:
+                on_result(record)
+
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a batch of research queries through the pipeline.")
+    parser.add_argument("queries", help="JSONL or CSV file of queries")
+    parser.add_argument("-o", "--output", required=True, help="JSONL file to append results to (also the checkpoint)")
+    parser.add_argument("--workers", type=int, default=4, help="Queries processed concurrently")
+    parser.add_argument("--depth", type=int, default=3, help="Research depth (1-5)")
+    parser.add_argument("--max-sources", type=int, default=5, help="Maximum sources per query")
+    parser.add_argument("--no-citations", action="store_true", help="Draft answers without citations")
+    parser.add_argument("--search-rps", type=float, default=2.0, help="Search requests per second")
+    parser.add_argument("--llm-rps", type=float, default=1.0, help="Drafting model requests per second")
+    parser.add_argument("--draft-mode", choices=DRAFT_MODES, default="single",
+                        help="Draft in one call, or summarize groups of sources in parallel first")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+
+    def report(record):
+        status = "failed" if "error" in record else "done"
+        print(f"[{status}] {record['input_id']}: {record['query']}", flush=True)
+
+    summary = run_batch(
+        args.queries, args.output,
+        workers=args.workers, depth=args.depth, max_sources=args.max_sources,
+        include_citations=not args.no_citations,
+        search_rps=args.search_rps, llm_rps=args.llm_rps, on_result=report, draft_mode=args.draft_mode,
+    )
+    print(
+        f"{summary['completed']} completed, {summary['failed']} failed, "
+        f"{summary['skipped']} skipped (already in {args.output}) of {summary['total']} queries"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
+import os
+import threading
+import time
+import uuid
+
+from agents.context import DRAFT_TOKEN_BUDGET
+from agents.events import TOKEN
+from agents.tracing import get_tracer
+from graph.workflow import get_workflow, stream_research
+
+# Research jobs run at once per process; further submissions wait in the queue
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 4))
+# Finished jobs kept in the registry before the oldest are forgotten
+MAX_FINISHED_JOBS = 500
+
+
+class JobStatus:
+    QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = "queued", "running", "succeeded", "failed", "cancelled"
+    FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+
+@dataclass(slots=True)
+class Job:
+    """A research query run in the background, with its progress so far."""
+    id: str
+    query: str
+    params: dict = field(default_factory=dict)
+    owner: str = None
+    status: str = JobStatus.QUEUED
+    submitted_at: float = field(default_factory=time.time)
+    started_at: float = None
+    finished_at: float = None
+    # Progress events other than answer tokens, oldest first
+    events: list = field(default_factory=list)
+    # The answer drafted so far, complete once the job has succeeded
+    answer: str = ""
+    research_output: object = None
+    research_id: str = None
+    error: str = None
+
+    @property
+    def done(self):
+        return self.status in JobStatus.FINISHED
+
+    @property
+    def stage(self):
+        return self.events[-1].stage if self.events else None
+
+    @property
+    def elapsed(self):
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+
+class JobManager:
+    """
+    Runs research queries on a thread pool and keeps a registry of their jobs.
+
+    ``submit`` returns at once with a job id; ``get`` returns a snapshot of the
+    job that can be polled for status, progress and the partial answer. Jobs
+    outlive the Streamlit script run that submitted them, so pages can change
+    or reload while they run.
+
+    Args:
+        workflow: Compiled research workflow; defaults to the process-wide one
+        workers: Number of jobs run at once
+        on_complete: Optional callable receiving each successful Job before it is
+            marked done, e.g. to save it to history; its return value is stored as
+            the job's ``research_id``
+    """
+
+    def __init__(self, workflow=None, workers=JOB_WORKERS, on_complete=None):
+        self.workflow = workflow
+        self.on_complete = on_complete
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="research-job")
+        self._jobs = {}
+        self._futures = {}
+        self._cancelled = set()
+        self._lock = threading.Lock()
+
+    def submit(self, query, owner=None, depth=3, max_sources=5, include_citations=True, cache_drafts=False,
+               token_budget=DRAFT_TOKEN_BUDGET, draft_mode="single"):
+        """
+        Queue a research query.
+
+        Args:
+            query: The research question
+            owner: Optional key, such as a browser session, used to list one user's jobs
+
+        Returns:
+            The new job's id
+        """
+        job = Job(
+            id=uuid.uuid4().hex,
+            query=query,
+            owner=owner,
+            params={
+                "depth": depth,
+                "max_sources": max_sources,
+                "include_citations": include_citations,
+                "cache_drafts": cache_drafts,
+                "token_budget": token_budget,
+                "draft_mode": draft_mode,
+            },
+        )
+        with self._lock:
+            self._jobs[job.id] = job
+            self._futures[job.id] = self._executor.submit(self._run, job)
+            self._prune()
+        return job.id
+
+    def get(self, job_id):
+        """Return a snapshot of a job, or None for an unknown id."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return replace(job, events=list(job.events)) if job is not None else None
+
+    def list(self, owner=None):
+        """Return snapshots of all jobs, or of one owner's jobs, newest first."""
+        with self._lock:
+            jobs = [job for job in self._jobs.values() if owner is None or job.owner == owner]
+            snapshots = [replace(job, events=list(job.events)) for job in jobs]
+        return sorted(snapshots, key=lambda job: job.submitted_at, reverse=True)
+
+    def cancel(self, job_id):
+        """
+        Cancel a job. A queued job never starts; a running one stops at its next progress update.
+
+        Returns:
+            False if the job is unknown or already finished
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.done:
+                return False
+            self._cancelled.add(job_id)
+            if self._futures[job_id].cancel():
+                self._finish(job, JobStatus.CANCELLED)
+        return True
+
+    def wait(self, job_id, timeout=None):
+        """Block until a job finishes (or ``timeout`` seconds pass) and return its snapshot."""
+        future = self._futures.get(job_id)
+        if future is not None:
+            try:
+                future.result(timeout=timeout)
+            except Exception:
+                pass
+        return self.get(job_id)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    def _finish(self, job, status, error=None):
+        job.status = status
+        job.error = error
+        job.finished_at = time.time()
+        self._cancelled.discard(job.id)
+
+    def _prune(self):
+        finished = [job for job in self._jobs.values() if job.done]
+        for job in sorted(finished, key=lambda job: job.finished_at)[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job.id]
+            del self._futures[job.id]
+
+    def _run(self, job):
+        with self._lock:
+            if job.id in self._cancelled:
+                self._finish(job, JobStatus.CANCELLED)
+                return
+            job.status = JobStatus.RUNNING
+            job.started_at = time.time()
+
+        try:
+            with get_tracer().span("job", query=job.query):
+                stream = stream_research(job.query, workflow=self.workflow or get_workflow(), **job.params)
+                try:
+                    for kind, payload in stream:
+                        if job.id in self._cancelled:
+                            with self._lock:
+                                self._finish(job, JobStatus.CANCELLED)
+                            return
+                        with self._lock:
+                            if kind == "state":
+                                job.research_output = payload["research_output"]
+                                job.answer = payload["final_answer"]
+                            elif payload.stage == TOKEN:
+                                job.answer += payload.message
+                            else:
+                                job.events.append(payload)
+                finally:
+                    stream.close()
+                research_id = self.on_complete(job) if self.on_complete is not None else None
+        except Exception as exc:
+            with self._lock:
+                self._finish(job, JobStatus.FAILED, str(exc) or type(exc).__name__)
+            return
+
+        with self._lock:
+            job.research_id = research_id
+            self._finish(job, JobStatus.SUCCEEDED)
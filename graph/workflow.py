@@ -1,31 +1,198 @@
-from langgraph.graph import StateGraph
+from typing import Annotated, TypedDict
+import operator
+import threading
+from langgraph.config import get_stream_writer
+from langgraph.graph import StateGraph, END
+from langgraph.types import Send
 from langchain_core.runnables import Runnable
-from agents.research_agent import get_research_tool
-from agents.drafting_agent import get_drafting_llm, draft_answer
-
-class ResearchState:
-    def __init__(self, query, research_output=None, final_answer=None):
-        self.query = query
-        self.research_output = research_output
-        self.final_answer = final_answer
-
-def research_node(state: ResearchState) -> ResearchState:
-    research_tool = get_research_tool()
-    result = research_tool.run(state.query)
-    return ResearchState(query=state.query, research_output=result)
-
-def draft_node(state: ResearchState) -> ResearchState:
-    llm = get_drafting_llm()
-    answer = draft_answer(llm, state.research_output)
-    return ResearchState(query=state.query, research_output=state.research_output, final_answer=answer)
-
-def create_workflow() -> Runnable:
+from agents.research_agent import (
+    decompose_query, search_with_cache, merge_results,
+    announce_search, announce_sources, SEARCH_CONCURRENCY,
+)
+from agents.sources import ResearchResult
+from agents.drafting_agent import get_drafting_llm, get_model_name, stream_draft_answer, stream_map_reduce_answer
+from agents.context import DRAFT_TOKEN_BUDGET, estimate_tokens
+from agents.events import ProgressEvent, TOKEN
+from agents.tracing import get_tracer
+
+
+class ResearchState(TypedDict, total=False):
+    query: str
+    depth: int
+    max_sources: int
+    include_citations: bool
+    cache_drafts: bool
+    token_budget: int
+    # "single" drafts from all sources in one call, "map_reduce" summarizes groups in parallel first
+    draft_mode: str
+    sub_queries: list[str]
+    # Each parallel research branch appends one entry; the reducer joins them
+    branches: Annotated[list[dict], operator.add]
+    research_output: ResearchResult
+    final_answer: str
+
+
+class BranchState(TypedDict):
+    sub_query: str
+    depth: int
+    max_sources: int
+
+
+def create_workflow(llm=None, search_backend=None, planner_llm=None, search_cache=None, draft_cache=None) -> Runnable:
+    """
+    Build the research → draft graph around a single set of reusable clients.
+
+    The question is planned into ``depth`` sub-queries, each searched in its own
+    parallel branch, and the branches are merged before drafting. Progress events
+    and answer tokens are published on the graph's ``custom`` stream.
+
+    Args:
+        llm: Drafting model; defaults to get_drafting_llm()
+        search_backend: Search callable; defaults to Tavily
+        planner_llm: Optional chat model used to write sub-queries
+        search_cache: Search result cache; defaults to the process-wide one
+        draft_cache: Drafted-answer cache; defaults to the process-wide one
+
+    Returns:
+        The compiled workflow
+    """
+    llm = llm or get_drafting_llm()
+
+    def plan_node(state: ResearchState) -> ResearchState:
+        with get_tracer().span("plan") as span:
+            sub_queries = decompose_query(state["query"], state.get("depth", 3), llm=planner_llm)
+            span.set(sub_queries=len(sub_queries))
+        announce_search(sub_queries, get_stream_writer())
+        return {"sub_queries": sub_queries}
+
+    def dispatch_research(state: ResearchState):
+        return [
+            Send("research", {
+                "sub_query": sub_query,
+                "depth": state.get("depth", 3),
+                "max_sources": state.get("max_sources", 5),
+            })
+            for sub_query in state["sub_queries"]
+        ]
+
+    def research_node(state: BranchState) -> ResearchState:
+        try:
+            with get_tracer().span("search", query=state["sub_query"]) as span:
+                results, cached = search_with_cache(
+                    state["sub_query"], state["depth"], state["max_sources"],
+                    backend=search_backend, cache=search_cache,
+                )
+                span.set(sources=len(results), cached=cached)
+        except Exception as exc:
+            return {"branches": [{"query": state["sub_query"], "results": [], "cached": False, "error": str(exc)}]}
+        return {"branches": [{"query": state["sub_query"], "results": results, "cached": cached}]}
+
+    def merge_node(state: ResearchState) -> ResearchState:
+        branches = [branch for branch in state["branches"] if "error" not in branch]
+        if not branches:
+            raise RuntimeError(f"All research branches failed: {state['branches'][0]['error']}")
+
+        sources = merge_results([branch["results"] for branch in branches], state.get("max_sources", 5))
+        cached = all(branch["cached"] for branch in branches)
+        announce_sources(sources, cached, get_stream_writer())
+        return {"research_output": ResearchResult(state["query"], sources, cached)}
+
+    def draft_node(state: ResearchState) -> ResearchState:
+        writer = get_stream_writer()
+        parts = []
+        draft = stream_map_reduce_answer if state.get("draft_mode") == "map_reduce" else stream_draft_answer
+        with get_tracer().span("drafting", mode=state.get("draft_mode", "single"), model=get_model_name(llm)) as span:
+            for chunk in draft(
+                llm,
+                state["research_output"],
+                include_citations=state.get("include_citations", True),
+                cache=draft_cache,
+                cache_nondeterministic=state.get("cache_drafts", False),
+                on_event=writer,
+                token_budget=state.get("token_budget", DRAFT_TOKEN_BUDGET),
+                max_sources=state.get("max_sources", 5),
+            ):
+                parts.append(chunk)
+                writer(ProgressEvent(TOKEN, chunk))
+            span.set(answer_tokens=estimate_tokens("".join(parts)))
+        return {"final_answer": "".join(parts)}
+
     graph = StateGraph(ResearchState)
+    graph.add_node("plan", plan_node)
     graph.add_node("research", research_node)
+    graph.add_node("merge", merge_node)
     graph.add_node("draft", draft_node)
-    
-    graph.set_entry_point("research")
-    graph.add_edge("research", "draft")
-    graph.set_finish_point("draft")
+
+    graph.set_entry_point("plan")
+    graph.add_conditional_edges("plan", dispatch_research, ["research"])
+    graph.add_edge("research", "merge")
+    graph.add_edge("merge", "draft")
+    graph.add_edge("draft", END)
 
     return graph.compile()
+
+
+_workflow = None
+_workflow_lock = threading.Lock()
+
+
+def get_workflow() -> Runnable:
+    """Return the process-wide workflow, compiled once with the default clients."""
+    global _workflow
+    with _workflow_lock:
+        if _workflow is None:
+            _workflow = create_workflow()
+    return _workflow
+
+
+def _initial_state(query, depth, max_sources, include_citations, cache_drafts, token_budget, draft_mode):
+    return {
+        "query": query,
+        "depth": depth,
+        "max_sources": max_sources,
+        "include_citations": include_citations,
+        "cache_drafts": cache_drafts,
+        "token_budget": token_budget,
+        "draft_mode": draft_mode,
+        "branches": [],
+    }
+
+
+def run_research(query, depth=3, max_sources=5, include_citations=True, cache_drafts=False, workflow=None,
+                 token_budget=DRAFT_TOKEN_BUDGET, draft_mode="single"):
+    """
+    Run the full research pipeline for one query.
+
+    Returns:
+        The final ResearchState, including the ``research_output`` ResearchResult and ``final_answer``
+    """
+    workflow = workflow or get_workflow()
+    with get_tracer().span("research", query=query, depth=depth, draft_mode=draft_mode):
+        return workflow.invoke(
+            _initial_state(query, depth, max_sources, include_citations, cache_drafts, token_budget, draft_mode),
+            {"max_concurrency": SEARCH_CONCURRENCY},
+        )
+
+
+def stream_research(query, depth=3, max_sources=5, include_citations=True, cache_drafts=False, workflow=None,
+                    token_budget=DRAFT_TOKEN_BUDGET, draft_mode="single"):
+    """
+    Run the research pipeline, yielding progress while it runs.
+
+    Yields:
+        ``("event", ProgressEvent)`` pairs as stages progress (answer chunks use the
+        TOKEN stage), followed by a final ``("state", ResearchState)`` pair
+    """
+    workflow = workflow or get_workflow()
+    final_state = None
+    with get_tracer().span("research", query=query, depth=depth, draft_mode=draft_mode):
+        for mode, payload in workflow.stream(
+            _initial_state(query, depth, max_sources, include_citations, cache_drafts, token_budget, draft_mode),
+            {"max_concurrency": SEARCH_CONCURRENCY},
+            stream_mode=["custom", "values"],
+        ):
+            if mode == "custom":
+                yield "event", payload
+            else:
+                final_state = payload
+    yield "state", final_state
@@ -0,0 +1,221 @@
+import hashlib
+import os
+import re
+import threading
+import numpy as np
+
+VECTOR_INDEX_DIR = os.getenv("VECTOR_INDEX_DIR", os.path.join(".data", "vectors"))
+SIMILARITY_THRESHOLD = float(os.getenv("SIMILARITY_THRESHOLD", 0.8))
+
+# Words too common in research questions to say anything about their topic
+STOPWORDS = frozenset(
+    "a an and are as at be by can compared could did do does for from has have how i in is it its "
+    "latest me of on or should tell than that the their there these this to vs was what when where "
+    "which who why will with would".split()
+)
+
+
+class HashingEmbedder:
+    """
+    CPU-only local embedder using the hashing trick over word unigrams and bigrams.
+
+    No model download or network access is needed. Any object with the same
+    ``dim`` attribute and ``embed(texts)`` method can be swapped in, for example
+    a wrapper around a sentence-transformers model.
+
+    Args:
+        dim: Dimension of the produced vectors
+    """
+
+    def __init__(self, dim=512):
+        self.dim = dim
+
+    def _features(self, text):
+        """Content words (crudely singularized) at full weight, adjacent pairs at half weight."""
+        words = [
+            word[:-1] if len(word) > 3 and word.endswith("s") and not word.endswith("ss") else word
+            for word in re.findall(r"\w+", text.lower())
+            if word not in STOPWORDS
+        ]
+        return [(word, 1.0) for word in words] + [(f"{a} {b}", 0.5) for a, b in zip(words, words[1:])]
+
+    def embed(self, texts):
+        """Return an ``(len(texts), dim)`` float32 array of L2-normalized vectors."""
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, weight in self._features(text):
+                digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+                bucket = int.from_bytes(digest[:4], "little") % self.dim
+                sign = 1.0 if digest[4] & 1 else -1.0
+                vectors[row, bucket] += sign * weight
+        # Dampen repeated words, then normalize so a dot product is the cosine similarity
+        vectors = np.sign(vectors) * np.log1p(np.abs(vectors))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+
+class VectorIndex:
+    """
+    Append-only store of unit vectors in a NumPy memmap with brute-force cosine top-k.
+
+    Vectors live in ``vectors.f32`` and their ids, one per line in row order, in
+    ``ids.txt``. Removed rows are zeroed so they can never score above a positive
+    threshold. The memmap doubles in capacity whenever it fills up.
+
+    Args:
+        directory: Folder holding the index files
+        dim: Vector dimension; must match the embedder
+    """
+
+    def __init__(self, directory=VECTOR_INDEX_DIR, dim=512, initial_capacity=1024):
+        self.directory = directory
+        self.dim = dim
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._vectors_path = os.path.join(directory, "vectors.f32")
+        self._ids_path = os.path.join(directory, "ids.txt")
+
+        self._ids = []
+        if os.path.exists(self._ids_path):
+            with open(self._ids_path, encoding="utf-8") as f:
+                self._ids = [line.rstrip("\n") or None for line in f]
+        self._rows = {research_id: row for row, research_id in enumerate(self._ids) if research_id}
+
+        capacity = max(initial_capacity, len(self._ids))
+        if os.path.exists(self._vectors_path):
+            capacity = max(capacity, os.path.getsize(self._vectors_path) // (4 * dim))
+        self._open(capacity)
+
+    def _open(self, capacity):
+        required = capacity * self.dim * 4
+        with open(self._vectors_path, "ab") as f:
+            if f.tell() < required:
+                f.truncate(required)
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, research_id):
+        return str(research_id) in self._rows
+
+    def add(self, research_id, vector):
+        research_id = str(research_id)
+        with self._lock:
+            if research_id in self._rows:
+                self._vectors[self._rows[research_id]] = vector
+                return
+            row = len(self._ids)
+            if row >= self._vectors.shape[0]:
+                self._vectors.flush()
+                self._open(self._vectors.shape[0] * 2)
+            self._vectors[row] = vector
+            self._vectors.flush()
+            self._ids.append(research_id)
+            self._rows[research_id] = row
+            with open(self._ids_path, "a", encoding="utf-8") as f:
+                f.write(research_id + "\n")
+
+    def remove(self, research_id):
+        research_id = str(research_id)
+        with self._lock:
+            row = self._rows.pop(research_id, None)
+            if row is None:
+                return
+            self._vectors[row] = 0
+            self._vectors.flush()
+            self._ids[row] = None
+            self._write_ids()
+
+    def clear(self):
+        with self._lock:
+            self._ids, self._rows = [], {}
+            self._vectors[:] = 0
+            self._vectors.flush()
+            self._write_ids()
+
+    def _write_ids(self):
+        with open(self._ids_path, "w", encoding="utf-8") as f:
+            f.writelines((research_id or "") + "\n" for research_id in self._ids)
+
+    def search(self, vector, k=5):
+        """
+        Return up to ``k`` ``(id, cosine_similarity)`` pairs, best first.
+
+        Scores every stored vector with one matrix-vector product and selects
+        the top ``k`` with ``argpartition`` instead of a full sort.
+        """
+        with self._lock:
+            count = len(self._ids)
+            if count == 0:
+                return []
+            scores = np.asarray(self._vectors[:count] @ np.asarray(vector, dtype=np.float32))
+            k = min(k, count)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [(self._ids[row], float(scores[row])) for row in top if self._ids[row] is not None]
+
+
+class SemanticIndex:
+    """
+    Similarity search over past research queries.
+
+    Args:
+        embedder: Object with ``dim`` and ``embed(texts)``; defaults to HashingEmbedder
+        directory: Folder holding the vector index files
+    """
+
+    def __init__(self, embedder=None, directory=VECTOR_INDEX_DIR):
+        self.embedder = embedder or HashingEmbedder()
+        self.vectors = VectorIndex(directory, dim=self.embedder.dim)
+
+    def add(self, research_id, query):
+        self.vectors.add(research_id, self.embedder.embed([query])[0])
+
+    def remove(self, research_id):
+        self.vectors.remove(research_id)
+
+    def clear(self):
+        self.vectors.clear()
+
+    def find_similar(self, query, threshold=SIMILARITY_THRESHOLD, k=3):
+        """Return ``(id, similarity)`` pairs for past queries at least ``threshold`` similar, best first."""
+        matches = self.vectors.search(self.embedder.embed([query])[0], k=k)
+        return [(research_id, score) for research_id, score in matches if score >= threshold]
+
+    def sync(self, history_store, batch_size=500):
+        """Index any stored entries missing from the vector index, e.g. history saved before it existed."""
+        batch = []
+        for entry in history_store.iter_entries(batch_size=batch_size):
+            if entry["id"] not in self.vectors:
+                batch.append(entry)
+            if len(batch) >= batch_size:
+                self._add_many(batch)
+                batch = []
+        if batch:
+            self._add_many(batch)
+
+    def _add_many(self, entries):
+        vectors = self.embedder.embed([entry["query"] for entry in entries])
+        for entry, vector in zip(entries, vectors):
+            self.vectors.add(entry["id"], vector)
+
+
+_semantic_index = None
+_semantic_index_lock = threading.Lock()
+
+
+def get_semantic_index():
+    """Return the process-wide semantic index, opening it on first use."""
+    global _semantic_index
+    with _semantic_index_lock:
+        if _semantic_index is None:
+            _semantic_index = SemanticIndex()
+    return _semantic_index
+
+
+def set_semantic_index(index):
+    """Replace the process-wide semantic index."""
+    global _semantic_index
+    with _semantic_index_lock:
+        _semantic_index = index
@@ -0,0 +1,316 @@
+"""
+Streaming export and import of research history.
+
+Entries are written one at a time as JSON lines, optionally gzip- or
+zstd-compressed, or in Parquet row groups, and read back in chunks that are
+merged into the history store, skipping ids it already holds. Only one chunk of
+entries is held in memory at a time, however large the history; lines that are
+not valid JSON are skipped and counted rather than ending the import. Older
+single-array JSON exports are the exception and are read whole.
+
+Usage:
+    python -m storage.export export history.jsonl.gz --tags ai --since 2025-01-01
+    python -m storage.export import history.jsonl.gz
+"""
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+import argparse
+import gzip
+import io
+import json
+
+from storage.history import generate_unique_id, serialize_entry
+from storage.history_store import get_history_store
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+# Entries read from the store, or from an import file, per chunk
+EXPORT_CHUNK_SIZE = 500
+
+FORMATS = {
+    "jsonl.gz": "JSON Lines (gzip)",
+    "jsonl.zst": "JSON Lines (zstd)",
+    "jsonl": "JSON Lines",
+    "parquet": "Parquet",
+}
+# Older exports were one JSON array; they can be imported but are read whole
+LEGACY_JSON = "json"
+
+if pa is not None:
+    PARQUET_SCHEMA = pa.schema([
+        ("id", pa.string()),
+        ("query", pa.string()),
+        ("research", pa.string()),
+        ("answer", pa.string()),
+        ("timestamp", pa.string()),
+        ("tags", pa.list_(pa.string())),
+        ("bookmarked", pa.bool_()),
+        ("word_count", pa.int64()),
+        ("sources_count", pa.int64()),
+    ])
+
+
+@dataclass(slots=True)
+class ImportResult:
+    """Counts of entries added, skipped as already stored, and rejected as incomplete or unreadable."""
+    imported: int = 0
+    duplicates: int = 0
+    invalid: int = 0
+
+
+def available_formats():
+    """Export formats usable with the installed packages, most compact first."""
+    return [
+        fmt for fmt in FORMATS
+        if not (fmt == "jsonl.zst" and zstandard is None) and not (fmt == "parquet" and pa is None)
+    ]
+
+
+def detect_format(filename):
+    """Guess a file's format from its extension, or return None."""
+    name = filename.lower()
+    for fmt in ("jsonl.gz", "jsonl.zst", "jsonl", "parquet"):
+        if name.endswith("." + fmt):
+            return fmt
+    if name.endswith(".ndjson"):
+        return "jsonl"
+    if name.endswith(".json"):
+        return LEGACY_JSON
+    return None
+
+
+def _require(fmt):
+    if fmt == "jsonl.zst" and zstandard is None:
+        raise RuntimeError("zstd compression needs the zstandard package")
+    if fmt == "parquet" and pa is None:
+        raise RuntimeError("Parquet needs the pyarrow package")
+    if fmt not in FORMATS and fmt != LEGACY_JSON:
+        raise ValueError(f"Unknown history file format: {fmt}")
+
+
+def date_range(start=None, end=None):
+    """Turn an inclusive range of dates into the ``since``/``until`` datetimes the store filters on."""
+    since = datetime.combine(start, datetime.min.time()) if start is not None else None
+    until = datetime.combine(end + timedelta(days=1), datetime.min.time()) if end is not None else None
+    return since, until
+
+
+def _chunks(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _write_parquet(entries, fileobj, chunk_size):
+    with pq.ParquetWriter(fileobj, PARQUET_SCHEMA, compression="zstd") as writer:
+        for chunk in _chunks(entries, chunk_size):
+            rows = [{**entry, "id": str(entry["id"])} for entry in chunk]
+            writer.write_table(pa.Table.from_pylist(rows, schema=PARQUET_SCHEMA))
+
+
+def _write_jsonl(entries, fileobj, fmt):
+    if fmt == "jsonl.gz":
+        stream = gzip.GzipFile(fileobj=fileobj, mode="wb")
+    elif fmt == "jsonl.zst":
+        stream = zstandard.ZstdCompressor().stream_writer(fileobj, closefd=False)
+    else:
+        stream = fileobj
+    text = io.TextIOWrapper(stream, encoding="utf-8", write_through=True)
+    for entry in entries:
+        text.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    text.flush()
+    # Detaching keeps the caller's file open; the compressors write their trailers on close
+    text.detach()
+    if stream is not fileobj:
+        stream.close()
+
+
+def export_history(destination, fmt=None, store=None, tags=None, bookmarked_only=False, since=None, until=None,
+                   chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Write history entries to a file, streaming them from the store.
+
+    Args:
+        destination: Path, or binary file object left open afterwards
+        fmt: One of FORMATS; defaults to the path's extension, else gzip-compressed JSON Lines
+        store: History store; defaults to the process-wide one
+        tags: Only entries with any of these tags
+        bookmarked_only: Only bookmarked entries
+        since: Only entries created at or after this datetime
+        until: Only entries created before this datetime
+        chunk_size: Entries read from the store (and written per Parquet row group) at a time
+
+    Returns:
+        The number of entries written
+    """
+    if fmt is None:
+        fmt = (detect_format(destination) if isinstance(destination, str) else None) or "jsonl.gz"
+    _require(fmt)
+    if fmt == LEGACY_JSON:
+        raise ValueError("Exports are written as JSON Lines or Parquet, not a single JSON array")
+    store = store or get_history_store()
+
+    count = 0
+
+    def entries():
+        nonlocal count
+        for entry in store.iter_entries(
+            batch_size=chunk_size, tags=tags, bookmarked_only=bookmarked_only, since=since, until=until
+        ):
+            count += 1
+            yield serialize_entry(entry)
+
+    fileobj = open(destination, "wb") if isinstance(destination, str) else destination
+    try:
+        if fmt == "parquet":
+            _write_parquet(entries(), fileobj, chunk_size)
+        else:
+            _write_jsonl(entries(), fileobj, fmt)
+    finally:
+        if fileobj is not destination:
+            fileobj.close()
+    return count
+
+
+def read_history(source, fmt, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield the records of a history file one at a time; ``source`` is a binary file object.
+
+    A JSON Lines line that cannot be decoded yields None in its place, so the
+    caller can count it and carry on with the rest of the file.
+    """
+    _require(fmt)
+    if fmt == "parquet":
+        for batch in pq.ParquetFile(source).iter_batches(batch_size=chunk_size):
+            yield from batch.to_pylist()
+        return
+    if fmt == LEGACY_JSON:
+        yield from json.load(source)
+        return
+
+    if fmt == "jsonl.gz":
+        stream = gzip.GzipFile(fileobj=source, mode="rb")
+    elif fmt == "jsonl.zst":
+        stream = io.BufferedReader(
+            zstandard.ZstdDecompressor().stream_reader(source, read_across_frames=True, closefd=False)
+        )
+    else:
+        stream = source
+    text = io.TextIOWrapper(stream, encoding="utf-8", errors="replace")
+    try:
+        for line in text:
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    yield None
+    finally:
+        # Detaching keeps the caller's file open, as in _write_jsonl; the decompressors leave it open on close
+        text.detach()
+        if stream is not source:
+            stream.close()
+
+
+def _to_entry(record):
+    """Fill in an imported record's derivable fields, or return None when it lacks the essentials."""
+    if not isinstance(record, dict) or not record.get("query") or record.get("answer") is None:
+        return None
+    timestamp = record.get("timestamp") or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    try:
+        datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S")
+    except (TypeError, ValueError):
+        return None
+    answer = record["answer"]
+    return {
+        "id": str(record.get("id") or generate_unique_id()),
+        "query": record["query"],
+        "research": record.get("research") or "",
+        "answer": answer,
+        "timestamp": timestamp,
+        "tags": list(record.get("tags") or []),
+        "bookmarked": bool(record.get("bookmarked", False)),
+        "word_count": record.get("word_count") or len(answer.split()),
+        "sources_count": record.get("sources_count") or 0,
+    }
+
+
+def import_history(source, fmt=None, store=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Merge the entries of a history file into the store, a chunk at a time.
+
+    Entries whose id is already stored, including repeats within the file, are
+    skipped, so importing the same file twice adds nothing the second time.
+    Malformed lines and incomplete records are counted as invalid and skipped.
+
+    Args:
+        source: Path, or binary file object such as a Streamlit upload
+        fmt: File format; defaults to the extension of the path or of the upload's ``name``
+
+    Returns:
+        An ImportResult
+    """
+    if fmt is None:
+        fmt = detect_format(source if isinstance(source, str) else getattr(source, "name", "")) or "jsonl"
+    store = store or get_history_store()
+    result = ImportResult()
+
+    fileobj = open(source, "rb") if isinstance(source, str) else source
+    try:
+        for chunk in _chunks(read_history(fileobj, fmt, chunk_size), chunk_size):
+            entries = [entry for entry in map(_to_entry, chunk) if entry is not None]
+            result.invalid += len(chunk) - len(entries)
+            added = store.add_many(entries)
+            result.imported += added
+            result.duplicates += len(entries) - added
+    finally:
+        if fileobj is not source:
+            fileobj.close()
+    return result
+
+
+def _parse_date(value):
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export or import research history.")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    exporter = subcommands.add_parser("export", help="Write history entries to a file")
+    exporter.add_argument("output", help="File to write; the format follows its extension (.jsonl.gz, .jsonl.zst, .jsonl, .parquet)")
+    exporter.add_argument("--format", choices=list(FORMATS), help="Override the format implied by the extension")
+    exporter.add_argument("--tags", nargs="+", help="Only entries with any of these tags")
+    exporter.add_argument("--bookmarked", action="store_true", help="Only bookmarked entries")
+    exporter.add_argument("--since", type=_parse_date, help="Only entries from this date (YYYY-MM-DD) on")
+    exporter.add_argument("--until", type=_parse_date, help="Only entries up to and including this date")
+    importer = subcommands.add_parser("import", help="Merge a history file into the history store")
+    importer.add_argument("input", help="History file written by export, the batch runner or an older JSON export")
+    importer.add_argument("--format", choices=list(FORMATS) + [LEGACY_JSON])
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        since, until = date_range(args.since, args.until)
+        count = export_history(
+            args.output, args.format, tags=args.tags, bookmarked_only=args.bookmarked, since=since, until=until
+        )
+        print(f"Exported {count} entries to {args.output}")
+    else:
+        result = import_history(args.input, args.format)
+        print(f"Imported {result.imported} entries ({result.duplicates} already stored, {result.invalid} invalid)")
+
+
+if __name__ == "__main__":
+    main()
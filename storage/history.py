@@ -0,0 +1,39 @@
+from datetime import datetime
+
+from storage.ids import new_ulid
+
+TAG_STOPWORDS = ["what", "where", "when", "which", "how", "does", "the", "and", "that", "this"]
+
+
+def generate_unique_id():
+    """Generate a collision-free ID (a ULID) that sorts in creation order"""
+    return new_ulid()
+
+
+def suggest_tags(query):
+    """Pick up to 3 tags from the longer words of a query"""
+    possible_tags = [word.lower() for word in query.split() 
+                    if len(word) > 4 and word.lower() not in TAG_STOPWORDS]
+    return possible_tags[:3] if possible_tags else ["research"]
+
+
+def build_history_entry(query, research_result, final_answer):
+    """Build a history entry with metadata for a finished research run from its ResearchResult"""
+    now = datetime.now()
+    return {
+        "id": generate_unique_id(),
+        "query": query,
+        "research": research_result.to_text(),
+        "answer": final_answer,
+        "timestamp": now.strftime("%Y-%m-%d %H:%M:%S"),
+        "date_obj": now,
+        "tags": suggest_tags(query),
+        "bookmarked": False,
+        "word_count": len(final_answer.split()),
+        "sources_count": len(research_result),
+    }
+
+
+def serialize_entry(entry):
+    """Drop fields that are not JSON-serializable, as used for exports"""
+    return {k: v for k, v in entry.items() if k != "date_obj"}
@@ -0,0 +1,450 @@
+from abc import ABC, abstractmethod
+from datetime import datetime
+import json
+import os
+import re
+import sqlite3
+import threading
+
+HISTORY_DB_PATH = os.getenv("HISTORY_DB_PATH", os.path.join(".data", "history.sqlite"))
+PREVIEW_CHARS = 200
+# Relevance ranking considers at most this many of the newest matches, keeping
+# searches for very common words fast however large the history grows
+RANK_WINDOW = 1000
+
+# Columns that make up a lightweight summary; the heavy research/answer bodies are left out
+SUMMARY_FIELDS = ["id", "query", "timestamp", "tags", "bookmarked", "word_count", "sources_count", "preview"]
+
+# Full-text index over queries and answers, kept in sync with the history table by triggers
+FTS_SCHEMA = """
+    CREATE VIRTUAL TABLE history_fts USING fts5(
+        query, answer, content='history', content_rowid='rowid',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    );
+    -- Rank by BM25 with query matches weighing double
+    INSERT INTO history_fts(history_fts, rank) VALUES ('rank', 'bm25(2.0, 1.0)');
+    CREATE TRIGGER history_fts_insert AFTER INSERT ON history BEGIN
+        INSERT INTO history_fts(rowid, query, answer) VALUES (new.rowid, new.query, new.answer);
+    END;
+    CREATE TRIGGER history_fts_delete AFTER DELETE ON history BEGIN
+        INSERT INTO history_fts(history_fts, rowid, query, answer) VALUES ('delete', old.rowid, old.query, old.answer);
+    END;
+    CREATE TRIGGER history_fts_update AFTER UPDATE OF query, answer ON history BEGIN
+        INSERT INTO history_fts(history_fts, rowid, query, answer) VALUES ('delete', old.rowid, old.query, old.answer);
+        INSERT INTO history_fts(rowid, query, answer) VALUES (new.rowid, new.query, new.answer);
+    END;
+    INSERT INTO history_fts(history_fts) VALUES ('rebuild');
+"""
+
+# Dashboard counters maintained by triggers on every insert and delete, so reading
+# them costs the same however large the history grows. The inserts at the end
+# seed them from any history saved before they existed.
+METRICS_SCHEMA = """
+    CREATE TABLE metrics_totals (
+        id INTEGER PRIMARY KEY CHECK (id = 0),
+        entries INTEGER NOT NULL,
+        sources_sum INTEGER NOT NULL,
+        word_sum INTEGER NOT NULL,
+        version INTEGER NOT NULL
+    );
+    CREATE TABLE metrics_daily (day TEXT PRIMARY KEY, entries INTEGER NOT NULL);
+    CREATE TABLE metrics_tags (tag TEXT PRIMARY KEY, uses INTEGER NOT NULL);
+    CREATE INDEX metrics_tags_uses ON metrics_tags(uses DESC, tag);
+    CREATE TRIGGER metrics_history_insert AFTER INSERT ON history BEGIN
+        UPDATE metrics_totals SET entries = entries + 1, sources_sum = sources_sum + new.sources_count,
+            word_sum = word_sum + new.word_count, version = version + 1;
+        INSERT INTO metrics_daily VALUES (date(new.created_at, 'unixepoch', 'localtime'), 1)
+            ON CONFLICT(day) DO UPDATE SET entries = entries + 1;
+    END;
+    CREATE TRIGGER metrics_history_delete AFTER DELETE ON history BEGIN
+        UPDATE metrics_totals SET entries = entries - 1, sources_sum = sources_sum - old.sources_count,
+            word_sum = word_sum - old.word_count, version = version + 1;
+        UPDATE metrics_daily SET entries = entries - 1 WHERE day = date(old.created_at, 'unixepoch', 'localtime');
+        DELETE FROM metrics_daily WHERE day = date(old.created_at, 'unixepoch', 'localtime') AND entries <= 0;
+    END;
+    CREATE TRIGGER metrics_tags_insert AFTER INSERT ON entry_tags BEGIN
+        INSERT INTO metrics_tags VALUES (new.tag, 1) ON CONFLICT(tag) DO UPDATE SET uses = uses + 1;
+    END;
+    CREATE TRIGGER metrics_tags_delete AFTER DELETE ON entry_tags BEGIN
+        UPDATE metrics_tags SET uses = uses - 1 WHERE tag = old.tag;
+        DELETE FROM metrics_tags WHERE tag = old.tag AND uses <= 0;
+    END;
+    INSERT INTO metrics_totals
+        SELECT 0, COUNT(*), COALESCE(SUM(sources_count), 0), COALESCE(SUM(word_count), 0), 0 FROM history;
+    INSERT INTO metrics_daily
+        SELECT date(created_at, 'unixepoch', 'localtime') AS day, COUNT(*) FROM history GROUP BY day;
+    INSERT INTO metrics_tags SELECT tag, COUNT(*) FROM entry_tags GROUP BY tag;
+"""
+
+
+def build_fts_query(search_term):
+    """
+    Translate a search box string into an FTS5 MATCH expression.
+
+    Text in double quotes is matched as a phrase and other words as whole tokens,
+    except the last word, which is matched as a prefix so results keep up while
+    the user is typing ("renew" finds "renewable"). All parts must match.
+
+    Returns:
+        The MATCH expression, or an empty string when the term has no searchable words
+    """
+    parts = []
+    for phrase, word in re.findall(r'"([^"]*)"|(\S+)', search_term):
+        if phrase:
+            tokens = re.findall(r"\w+", phrase)
+            if tokens:
+                parts.append('"' + " ".join(tokens) + '"')
+        else:
+            parts.extend(f'"{token}"' for token in re.findall(r"\w+", word))
+    if parts and not search_term.rstrip().endswith('"'):
+        parts[-1] += "*"
+    return " ".join(parts)
+
+
+class HistoryStore(ABC):
+    """
+    Interface for research history backends.
+
+    Full entries (with ``research`` and ``answer`` bodies) are only returned by
+    ``get`` and ``iter_entries``; listing methods return summaries so callers
+    can page through large histories cheaply.
+    """
+
+    @abstractmethod
+    def add(self, entry):
+        """Persist a history entry and return its id"""
+
+    @abstractmethod
+    def get(self, research_id):
+        """Return the full entry for an id, or None"""
+
+    @abstractmethod
+    def list_summaries(self, offset=0, limit=50, bookmarked_only=False):
+        """Return a page of entry summaries, newest first"""
+
+    @abstractmethod
+    def count(self, bookmarked_only=False):
+        """Return the number of stored entries"""
+
+    @abstractmethod
+    def search(self, search_term="", selected_tags=None, bookmarked_only=False, offset=0, limit=50):
+        """Return a page of summaries matching the filters, newest first, and the total match count"""
+
+    @abstractmethod
+    def set_bookmarked(self, research_id, status=True):
+        """Bookmark or unbookmark an entry"""
+
+    @abstractmethod
+    def metrics_version(self):
+        """Return a number that changes whenever the metrics may have changed"""
+
+    @abstractmethod
+    def metrics(self, top_tags=5):
+        """Return totals, averages, per-day counts and the most used tags"""
+
+    @abstractmethod
+    def tags(self):
+        """Return every tag in use, sorted"""
+
+    @abstractmethod
+    def delete(self, research_id):
+        """Remove one entry"""
+
+    @abstractmethod
+    def clear(self):
+        """Remove every entry"""
+
+    @abstractmethod
+    def add_many(self, entries):
+        """Persist entries whose ids are not stored yet, skipping the others, and return the number added"""
+
+    @abstractmethod
+    def iter_entries(self, batch_size=500, tags=None, bookmarked_only=False, since=None, until=None):
+        """
+        Yield every full entry, oldest first, reading ``batch_size`` rows at a time.
+
+        Optionally only entries with any of ``tags``, bookmarked ones, or those
+        created at or after ``since`` and before ``until`` (datetimes).
+        """
+
+
+class SQLiteHistoryStore(HistoryStore):
+    """
+    History store persisted in a SQLite database.
+
+    Args:
+        path: Database file location (``":memory:"`` for a throwaway store)
+    """
+
+    def __init__(self, path=HISTORY_DB_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS history (
+                id TEXT PRIMARY KEY,
+                query TEXT NOT NULL,
+                research TEXT NOT NULL,
+                answer TEXT NOT NULL,
+                timestamp TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                tags TEXT NOT NULL,
+                bookmarked INTEGER NOT NULL DEFAULT 0,
+                word_count INTEGER NOT NULL DEFAULT 0,
+                sources_count INTEGER NOT NULL DEFAULT 0,
+                preview TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS history_created ON history(created_at);
+            CREATE INDEX IF NOT EXISTS history_bookmarked ON history(bookmarked, created_at);
+            CREATE TABLE IF NOT EXISTS entry_tags (
+                tag TEXT NOT NULL,
+                id TEXT NOT NULL REFERENCES history(id) ON DELETE CASCADE,
+                PRIMARY KEY (tag, id)
+            );
+            CREATE INDEX IF NOT EXISTS entry_tags_id ON entry_tags(id);
+        """)
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._fts = self._ensure_fts()
+        self._ensure_metrics()
+        self._conn.commit()
+
+    def _ensure_fts(self):
+        """Create the full-text index if needed; returns False when SQLite lacks FTS5."""
+        exists = self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'history_fts'"
+        ).fetchone()
+        if exists:
+            return True
+        try:
+            self._conn.executescript(FTS_SCHEMA)
+        except sqlite3.OperationalError:
+            return False
+        return True
+
+    def _ensure_metrics(self):
+        exists = self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'metrics_totals'"
+        ).fetchone()
+        if not exists:
+            self._conn.executescript(METRICS_SCHEMA)
+
+    @staticmethod
+    def _summary(row):
+        summary = {field: row[field] for field in SUMMARY_FIELDS}
+        summary["tags"] = json.loads(summary["tags"])
+        summary["bookmarked"] = bool(summary["bookmarked"])
+        return summary
+
+    @staticmethod
+    def _entry(row):
+        entry = SQLiteHistoryStore._summary(row)
+        entry.pop("preview")
+        entry["research"] = row["research"]
+        entry["answer"] = row["answer"]
+        entry["date_obj"] = datetime.fromtimestamp(row["created_at"])
+        return entry
+
+    def _insert(self, entry, skip_existing=False):
+        """Insert one entry and its tags without committing; returns False if its id was stored already."""
+        research_id = str(entry["id"])
+        date_obj = entry.get("date_obj") or datetime.strptime(entry["timestamp"], "%Y-%m-%d %H:%M:%S")
+        cursor = self._conn.execute(
+            "INSERT" + (" OR IGNORE" if skip_existing else "") + " INTO history (id, query, research, answer,"
+            " timestamp, created_at, tags, bookmarked, word_count, sources_count, preview)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                research_id, entry["query"], entry["research"], entry["answer"], entry["timestamp"],
+                date_obj.timestamp(), json.dumps(entry.get("tags", [])), int(entry.get("bookmarked", False)),
+                entry.get("word_count", 0), entry.get("sources_count", 0), entry["answer"][:PREVIEW_CHARS],
+            ),
+        )
+        if not cursor.rowcount:
+            return False
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO entry_tags (tag, id) VALUES (?, ?)",
+            [(tag, research_id) for tag in entry.get("tags", [])],
+        )
+        return True
+
+    def add(self, entry):
+        with self._lock:
+            self._insert(entry)
+            self._conn.commit()
+        return str(entry["id"])
+
+    def add_many(self, entries):
+        """Insert a batch of entries in one transaction; ids already stored are skipped."""
+        with self._lock:
+            try:
+                added = sum(self._insert(entry, skip_existing=True) for entry in entries)
+            except Exception:
+                self._conn.rollback()
+                raise
+            self._conn.commit()
+        return added
+
+    def get(self, research_id):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM history WHERE id = ?", (str(research_id),)).fetchone()
+        return self._entry(row) if row else None
+
+    def list_summaries(self, offset=0, limit=50, bookmarked_only=False):
+        return self.search(bookmarked_only=bookmarked_only, offset=offset, limit=limit)[0]
+
+    def count(self, bookmarked_only=False):
+        sql = "SELECT COUNT(*) FROM history" + (" WHERE bookmarked = 1" if bookmarked_only else "")
+        with self._lock:
+            return self._conn.execute(sql).fetchone()[0]
+
+    def search(self, search_term="", selected_tags=None, bookmarked_only=False, offset=0, limit=50):
+        """
+        Summaries matching every given filter, with the total match count.
+
+        With a search term, the newest RANK_WINDOW matches are ranked by BM25
+        relevance (query matches weigh double) and older matches follow, newest
+        first; otherwise results are ordered newest first. The total always
+        counts every match.
+        """
+        clauses, params = [], []
+        if bookmarked_only:
+            clauses.append("h.bookmarked = 1")
+        if selected_tags:
+            placeholders = ", ".join("?" * len(selected_tags))
+            clauses.append(f"h.id IN (SELECT id FROM entry_tags WHERE tag IN ({placeholders}))")
+            params += list(selected_tags)
+
+        fts_query = build_fts_query(search_term) if search_term and self._fts else ""
+        if search_term and not self._fts:
+            clauses.append("(h.query LIKE ? OR h.answer LIKE ?)")
+            params += [f"%{search_term}%"] * 2
+
+        columns = ", ".join(f"h.{field}" for field in SUMMARY_FIELDS)
+        if fts_query:
+            where = "".join(f" AND {clause}" for clause in clauses)
+            matches = f"FROM history_fts JOIN history h ON h.rowid = history_fts.rowid WHERE history_fts MATCH ?{where}"
+            # Without other filters the index alone can count matches, skipping the join
+            count_sql = f"SELECT COUNT(*) {matches}" if clauses else (
+                "SELECT COUNT(*) FROM history_fts WHERE history_fts MATCH ?"
+            )
+            # Rank only the newest matches (the index yields them in rowid order), then sort that window by relevance
+            newest_first = f"SELECT {columns}, history_fts.rank AS rank {matches} ORDER BY history_fts.rowid DESC"
+            select_sql = f"SELECT * FROM ({newest_first} LIMIT {RANK_WINDOW}) ORDER BY rank LIMIT ? OFFSET ?"
+            params = [fts_query] + params
+        else:
+            where = " WHERE " + " AND ".join(clauses) if clauses else ""
+            count_sql = f"SELECT COUNT(*) FROM history h{where}"
+            select_sql = f"SELECT {columns} FROM history h{where} ORDER BY h.created_at DESC LIMIT ? OFFSET ?"
+
+        with self._lock:
+            total = self._conn.execute(count_sql, params).fetchone()[0]
+            if not fts_query:
+                rows = self._conn.execute(select_sql, params + [limit, offset]).fetchall()
+            else:
+                rows = []
+                if offset < RANK_WINDOW:
+                    rows = self._conn.execute(select_sql, params + [min(limit, RANK_WINDOW - offset), offset]).fetchall()
+                # Pages reaching past the ranked window continue with the older matches
+                if len(rows) < limit and offset + limit > RANK_WINDOW:
+                    rows += self._conn.execute(
+                        f"{newest_first} LIMIT ? OFFSET ?", params + [limit - len(rows), max(offset, RANK_WINDOW)]
+                    ).fetchall()
+        return [self._summary(row) for row in rows], total
+
+    def set_bookmarked(self, research_id, status=True):
+        with self._lock:
+            self._conn.execute("UPDATE history SET bookmarked = ? WHERE id = ?", (int(status), str(research_id)))
+            self._conn.commit()
+
+    def metrics_version(self):
+        with self._lock:
+            return self._conn.execute("SELECT version FROM metrics_totals").fetchone()[0]
+
+    def metrics(self, top_tags=5):
+        """Read the trigger-maintained counters; cost depends on the number of days, not entries."""
+        with self._lock:
+            total, sources_sum, word_sum, version = self._conn.execute(
+                "SELECT entries, sources_sum, word_sum, version FROM metrics_totals"
+            ).fetchone()
+            research_by_date = self._conn.execute("SELECT day, entries FROM metrics_daily ORDER BY day").fetchall()
+            popular_tags = self._conn.execute(
+                "SELECT tag, uses FROM metrics_tags ORDER BY uses DESC, tag LIMIT ?", (top_tags,)
+            ).fetchall()
+        return {
+            "version": version,
+            "total_research": total,
+            "avg_sources": sources_sum / total if total else 0,
+            "avg_word_count": word_sum / total if total else 0,
+            "research_by_date": [tuple(row) for row in research_by_date],
+            "popular_tags": [tuple(row) for row in popular_tags],
+        }
+
+    def tags(self):
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT DISTINCT tag FROM entry_tags ORDER BY tag")]
+
+    def delete(self, research_id):
+        with self._lock:
+            self._conn.execute("DELETE FROM history WHERE id = ?", (str(research_id),))
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM entry_tags")
+            self._conn.execute("DELETE FROM history")
+            self._conn.commit()
+
+    def iter_entries(self, batch_size=500, tags=None, bookmarked_only=False, since=None, until=None):
+        clauses, params = [], []
+        if bookmarked_only:
+            clauses.append("bookmarked = 1")
+        if tags:
+            clauses.append(f"id IN (SELECT id FROM entry_tags WHERE tag IN ({', '.join('?' * len(tags))}))")
+            params += list(tags)
+        if since is not None:
+            clauses.append("created_at >= ?")
+            params.append(since.timestamp())
+        if until is not None:
+            clauses.append("created_at < ?")
+            params.append(until.timestamp())
+        where = "".join(f" AND {clause}" for clause in clauses)
+
+        last_created, last_id = -1.0, ""
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT * FROM history WHERE (created_at, id) > (?, ?){where}"
+                    " ORDER BY created_at, id LIMIT ?",
+                    [last_created, last_id] + params + [batch_size],
+                ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield self._entry(row)
+            last_created, last_id = rows[-1]["created_at"], rows[-1]["id"]
+
+
+_history_store = None
+_history_store_lock = threading.Lock()
+
+
+def get_history_store():
+    """Return the process-wide history store, opening it on first use."""
+    global _history_store
+    with _history_store_lock:
+        if _history_store is None:
+            _history_store = SQLiteHistoryStore(HISTORY_DB_PATH)
+    return _history_store
+
+
+def set_history_store(store):
+    """Replace the process-wide history store."""
+    global _history_store
+    with _history_store_lock:
+        _history_store = store
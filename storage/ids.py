@@ -0,0 +1,40 @@
+import secrets
+import threading
+import time
+
+# Crockford's base32, as used by ULIDs: no I, L, O or U
+ULID_ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+ULID_LENGTH = 26
+_RANDOM_BITS = 80
+
+_last_ms = -1
+_last_random = 0
+_lock = threading.Lock()
+
+
+def new_ulid():
+    """
+    Return a new ULID: a 48-bit millisecond timestamp followed by 80 random bits, as 26 characters.
+
+    IDs sort in creation order as plain strings. Within one millisecond (or if the
+    clock steps back) the random part of the previous ID is incremented, so IDs
+    from one process are strictly increasing; the random bits keep IDs from
+    different processes apart.
+    """
+    global _last_ms, _last_random
+    with _lock:
+        ms = time.time_ns() // 1_000_000
+        if ms <= _last_ms:
+            ms, random = _last_ms, _last_random + 1
+            if random >> _RANDOM_BITS:
+                ms, random = ms + 1, secrets.randbits(_RANDOM_BITS)
+        else:
+            random = secrets.randbits(_RANDOM_BITS)
+        _last_ms, _last_random = ms, random
+
+    value = (ms << _RANDOM_BITS) | random
+    chars = []
+    for _ in range(ULID_LENGTH):
+        chars.append(ULID_ALPHABET[value & 31])
+        value >>= 5
+    return "".join(reversed(chars))
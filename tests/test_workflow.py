@@ -0,0 +1,117 @@
+"""End-to-end runs of the research workflow over fake search and drafting providers."""
+import pytest
+
+from agents.cache import LRUCache
+from agents.events import (
+    CONTEXT_PACKED, DONE, DRAFTING_STARTED, FIRST_TOKEN, SEARCH_STARTED, SOURCES_RECEIVED, TOKEN,
+)
+from agents.fakes import FakeSearchBackend, FakeStreamingChatModel
+from agents.tracing import Tracer, get_tracer, set_tracer
+from graph.workflow import create_workflow, run_research, stream_research
+
+QUERY = "solar power in india"
+ANSWER = "Solar capacity in India has grown quickly [1], led by utility-scale parks [2]."
+
+
+@pytest.fixture(autouse=True)
+def untraced():
+    """Keep spans from these runs out of the trace file."""
+    tracer = get_tracer()
+    set_tracer(Tracer([]))
+    yield
+    set_tracer(tracer)
+
+
+def build(search_backend=None, **llm_options):
+    llm = FakeStreamingChatModel(response=ANSWER, **llm_options)
+    search_backend = search_backend or FakeSearchBackend()
+    workflow = create_workflow(
+        llm=llm, search_backend=search_backend, search_cache=LRUCache(), draft_cache=LRUCache()
+    )
+    return workflow, llm, search_backend
+
+
+def stages(events):
+    """Collapse the event stream's stages, folding consecutive answer tokens into one."""
+    collapsed = []
+    for event in events:
+        if not (event.stage == TOKEN and collapsed and collapsed[-1] == TOKEN):
+            collapsed.append(event.stage)
+    return collapsed
+
+
+@pytest.mark.parametrize("draft_mode", ["single", "map_reduce"])
+def test_stream_research_events_and_answer(draft_mode):
+    workflow, _, _ = build()
+
+    items = list(stream_research(QUERY, depth=3, max_sources=8, workflow=workflow, draft_mode=draft_mode))
+
+    kinds = [kind for kind, _ in items]
+    assert kinds[-1] == "state" and kinds.count("state") == 1
+    events = [payload for kind, payload in items if kind == "event"]
+    assert stages(events) == [
+        SEARCH_STARTED, SOURCES_RECEIVED, CONTEXT_PACKED, DRAFTING_STARTED, FIRST_TOKEN, TOKEN, DONE,
+    ]
+    state = items[-1][1]
+    assert state["final_answer"] == ANSWER
+    assert "".join(event.message for event in events if event.stage == TOKEN) == ANSWER
+
+
+def test_sources_are_merged_across_branches():
+    workflow, _, backend = build()
+
+    state = run_research(QUERY, depth=3, max_sources=8, workflow=workflow)
+
+    # One branch per sub-query, each searched once
+    assert len(backend.calls) == 3 and len(set(backend.calls)) == 3
+    urls = [source.url for source in state["research_output"].sources]
+    assert len(urls) == 8
+    assert len(set(urls)) == len(urls)
+    # Every branch returns the shared result; it is kept once, ahead of the rest
+    assert urls[0] == "https://example.com/shared/0"
+    for sub_query in backend.calls:
+        slug = sub_query.replace(" ", "-")
+        assert any(f"/{slug}/" in url for url in urls)
+
+
+def test_failed_branch_is_dropped():
+    workflow, _, backend = build(search_backend=FakeSearchBackend(failures=1))
+
+    state = run_research(QUERY, depth=3, max_sources=8, workflow=workflow)
+
+    assert len(backend.calls) == 3
+    assert state["final_answer"] == ANSWER
+    assert state["research_output"].sources
+
+
+def test_all_branches_failing_raises():
+    workflow, _, _ = build(search_backend=FakeSearchBackend(failures=3))
+
+    with pytest.raises(RuntimeError, match="All research branches failed"):
+        run_research(QUERY, depth=3, max_sources=8, workflow=workflow)
+
+
+def test_map_reduce_summarizes_groups_before_reducing():
+    workflow, llm, _ = build()
+
+    items = list(stream_research(QUERY, depth=3, max_sources=8, workflow=workflow, draft_mode="map_reduce"))
+
+    started = next(payload for kind, payload in items if kind == "event" and payload.stage == DRAFTING_STARTED)
+    # Packing drops near-duplicate snippets first, so there are fewer groups than sources / 3
+    assert started.data["groups"] >= 2
+    # One map call per group of up to three packed sources, then one reduce call
+    assert llm.calls == started.data["groups"] + 1
+    assert items[-1][1]["final_answer"] == ANSWER
+
+
+def test_repeated_query_is_served_from_the_caches():
+    workflow, llm, backend = build()
+
+    first = run_research(QUERY, depth=3, max_sources=8, workflow=workflow)
+    second = run_research(QUERY, depth=3, max_sources=8, workflow=workflow)
+
+    assert second["research_output"].cached
+    assert second["final_answer"] == first["final_answer"] == ANSWER
+    assert len(backend.calls) == 3
+    # The fake model samples at temperature 0, so its answer is reused
+    assert llm.calls == 1